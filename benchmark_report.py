@@ -1,14 +1,18 @@
+import bisect
 import json
 import os
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
-from dotenv import load_dotenv
-
-from utils.db_connection import DBConnector
-from utils.file import load_config
-from utils.git_utils import get_git_branch, get_git_hash, get_local_changes
-from task_processor import get_cli_version, get_engine_version
+from utils.db_connection import DBConnector, get_db_stats
+from utils.db_writer import ResultWriter
+from utils.file import load_config, write_json_atomic
+from utils.journal import ResultJournal, load_journal
+from utils.run_metadata import get_run_metadata
+from utils.timing import PERCENTILES, percentile
+from utils.tracing import record_span, span
 
 
 class BenchmarkReport:
@@ -20,9 +24,17 @@ class BenchmarkReport:
         config_file="./config/benchmark_config.json",
         retry_limit=3,
         description=None,
+        resume_from=None,
+        output_path=None,
     ):
+        from dotenv import load_dotenv
+
         load_dotenv(".env")
-        DBConnector()  # Test DB connection
+        # Test DB connection while probing git and the CLI
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            db_check = executor.submit(DBConnector().check)
+            run_metadata = get_run_metadata()
+            db_check.result()
         self.benchmark_name = benchmark_name
         self.retry_limit = retry_limit
         self.date = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
@@ -34,10 +46,10 @@ class BenchmarkReport:
         # Extra information about the benchmark
         self.extra_info = {
             "description": self.description,
-            "benchmark_branch": get_git_branch(),
-            "benchmark_hash": get_git_hash(),
-            "benchmark_local_changes": get_local_changes(),
-            "cli_version": get_cli_version(),
+            "benchmark_branch": run_metadata["benchmark_branch"],
+            "benchmark_hash": run_metadata["benchmark_hash"],
+            "benchmark_local_changes": run_metadata["benchmark_local_changes"],
+            "cli_version": run_metadata["cli_version"],
             # "engine_version": get_engine_version(),
         }
         print(f"Benchmark extra_info:\n{json.dumps(self.extra_info, indent=4)}")
@@ -57,6 +69,7 @@ class BenchmarkReport:
                 "max_accuracy": 0.0,
                 "min_accuracy": 1.0,
             },
+            "phases": {},
         }
         self.model_pair = [os.getenv("MAIN_ENGINE"), os.getenv("SECONDARY_ENGINE")]
         self.pre_process_model = "META_LLAMA3_70B_CEREBRAS"
@@ -65,9 +78,13 @@ class BenchmarkReport:
         self.reset = self.config.get(
             "reset", True
         )  # Reset the Benchmark results if True, else append the results for stats.
-        self.output_path = f"./results/benchmark_report_{self.date}.json"
+        self.output_path = output_path or f"./results/benchmark_report_{self.date}.json"
+        self.journal_path = os.path.splitext(self.output_path)[0] + ".jsonl"
+        self.writer = ResultWriter()
 
-        if os.path.exists(self.output_path) and not self.reset:
+        if resume_from:
+            self.existing_data = self._load_previous_run(resume_from)
+        elif os.path.exists(self.output_path) and not self.reset:
             with open(self.output_path, "r") as file:
                 self.existing_data = json.load(file)
         else:
@@ -82,26 +99,117 @@ class BenchmarkReport:
                 "summary": self.summary,
             }
 
-    def add_test(self, task):
+        # Tests by name and running aggregates, so adding a result doesn't
+        # rescan the whole report
+        self._tests_by_name = {}
+        self._test_totals = {}
+        self._totals = {
+            "completed_tests": 0,
+            "failed_tests": 0,
+            "total_duration": 0,
+            "total_accuracy": 0.0,
+        }
+        self._tag_totals = {}
+        # Sorted durations of each phase, for the percentiles, and their totals
+        self._phase_durations = {}
+        self._phase_totals = {}
+        self._task_hashes = {}
+
+        # Every test and result is journaled as it comes in, so a crashed run
+        # can be recovered; the JSON report is a compaction of this journal
+        # When resuming from a journal, its records must not be written twice
+        seed_journal = (
+            not os.path.exists(self.journal_path)
+            or os.path.getsize(self.journal_path) == 0
+        )
+        self.journal = ResultJournal(self.journal_path)
+        print(f"Benchmark journal: {self.journal_path}")
+        self.journal.append(
+            {
+                "type": "run",
+                "benchmark": self.existing_data["benchmark"],
+                "date": self.existing_data["date"],
+                "retry_limit": self.existing_data["retry_limit"],
+                "model_pair": self.existing_data["model_pair"],
+                "benchmark_file": self.existing_data["benchmark_file"],
+                "run_at": self.existing_data["run_at"],
+                "benchmark_id": self.id,
+            }
+        )
+        for test in self.existing_data["tests"]:
+            self._index_test(test)
+            if seed_journal:
+                self._journal_test(test)
+            for result in test["results"]:
+                self._record_result(test, result)
+                if seed_journal:
+                    self._journal_result(test, result)
+
+    def _load_previous_run(self, path):
+        """
+        Load the report data of a previous run to add more results to it.
+        The report, journal and benchmark_id of that run are reused.
+
+        Args:
+            path (str): Path to a benchmark report (.json) or journal (.jsonl).
+        """
+        if path.endswith(".jsonl"):
+            data = load_journal(path)
+            self.journal_path = path
+            self.output_path = path[: -len(".jsonl")] + ".json"
+        else:
+            with open(path, "r") as file:
+                data = json.load(file)
+            self.output_path = path
+            self.journal_path = os.path.splitext(path)[0] + ".jsonl"
+
+        # Reports don't store the benchmark_id at the top level, results do
+        benchmark_id = data.get("benchmark_id") or next(
+            (
+                result["benchmark_id"]
+                for test in data["tests"]
+                for result in test["results"]
+                if result.get("benchmark_id")
+            ),
+            None,
+        )
+        if benchmark_id:
+            self.id = benchmark_id
+        self.date = data.get("date", self.date)
+        self.run_at = data.get("run_at", self.run_at)
+        print(f"Resuming benchmark_id={self.id} from {path}")
+
+        return {
+            "benchmark": data.get("benchmark", self.benchmark_name),
+            "date": self.date,
+            "retry_limit": data.get("retry_limit", self.retry_limit),
+            "model_pair": data.get("model_pair", self.model_pair),
+            "benchmark_file": data.get("benchmark_file", self.config_file),
+            "run_at": self.run_at,
+            "tests": data["tests"],
+            "summary": self.summary,
+        }
+
+    def add_test(self, task, task_hash=None):
         """
         Add a new test entry to the benchmark report.
 
         Args:
             task (dict): The task dictionary containing the test details.
+            task_hash (str, optional): Fingerprint of the task, stored with its results.
         """
+        self._task_hashes[task["id"]] = task_hash
         # Append the test entry to the tests list
-        test_exists = any(
-            test["name"] == task["id"] for test in self.existing_data["tests"]
-        )
-        if not test_exists:
-            self.existing_data["tests"].append(
-                {
-                    "name": task["id"],
-                    "tags": task["tags"],
-                    "results": [],
-                    "extra_info": self.extra_info,
-                }
-            )
+        if task["id"] not in self._tests_by_name:
+            test = {
+                "name": task["id"],
+                "tags": task["tags"],
+                "results": [],
+                "extra_info": self.extra_info,
+            }
+            self.existing_data["tests"].append(test)
+            self._index_test(test)
+            self._journal_test(test)
 
     def add_result(self, result_entry):
         """
@@ -117,38 +225,36 @@ class BenchmarkReport:
             accuracy (float, optional): Accuracy of the result. Defaults to 1.0 if passed, 0.0 otherwise.
             error_message (str, optional): Any error message if the test failed.
         """
+        start_time = time.monotonic()
 
-        for test in self.existing_data.get("tests", []):
-            if test["name"] == result_entry["task_id"]:
-                result_entry["benchmark_id"] = self.id
-                result_entry["labels"] = test["tags"]
-                result_entry["pre_process_model"] = self.pre_process_model
-                result_entry["model_pair"] = self.model_pair
-
-                # Append the result to the specified test
-                test["results"].append(result_entry)
-                break
-        else:
+        test = self._tests_by_name.get(result_entry["task_id"])
+        if test is None:
             raise ValueError(
                 f"Test with name '{result_entry['task_id']}' does not exist. Add the test before adding results."
             )
 
+        result_entry["benchmark_id"] = self.id
+        result_entry["labels"] = test["tags"]
+        result_entry["pre_process_model"] = self.pre_process_model
+        result_entry["model_pair"] = self.model_pair
+        result_entry["task_hash"] = self._task_hashes.get(test["name"])
+
+        # Append the result to the specified test
+        test["results"].append(result_entry)
+        self._record_result(test, result_entry)
+        self._journal_result(test, result_entry)
+
         # Update summary after adding the result
         self._update_summary()
 
-        # Aggregate results for each test and store in the database
-        passed = all(result["passed"] for result in test["results"])
+        # Aggregate results for each test and queue them for the database
+        test_totals = self._test_totals[test["name"]]
+        passed = test_totals["passed"]
 
         # Store results in database
-        total_duration = sum(
-            result["metrics"]["duration_ms"] for result in test["results"]
-        )
-        average_accuracy = sum(
-            result["metrics"]["accuracy"] for result in test["results"]
-        ) / len(test["results"])
-        db_connector = DBConnector()
-        db_connector.connect()
-        db_connector.store_benchmark_result(
+        total_duration = test_totals["duration_ms"]
+        average_accuracy = test_totals["accuracy"] / len(test["results"])
+        self.writer.submit(
             {
                 "task_id": test["name"],
                 "task_name": test["name"],
@@ -166,54 +272,144 @@ class BenchmarkReport:
                 "error_message": result_entry.get("error_message"),
             }
         )
-        db_connector.close_connection()
+        record_span("add_result", start_time, task=test["name"])
 
-    def _update_summary(self):
-        total_duration = 0
-        total_accuracy = 0
-        completed_tests = 0
-        failed_tests = 0
-        test_durations = {}
+    def completed_tasks(self):
+        """
+        Get the tasks that already have a result in this report.
 
-        for test in self.existing_data.get("tests", []):
-            for result in test["results"]:
-                duration = (
-                    result["metrics"].get("duration_ms", 0) or 0
-                )  # Ensure duration is not None
-                accuracy = (
-                    result["metrics"].get("accuracy", 0) or 0
-                )  # Ensure accuracy is not None
+        A failed result without any attempt, like a task rejected by the
+        preflight checks or one whose run crashed, does not count: the task
+        is run again once fixed.
 
-                if result["passed"]:
-                    completed_tests += 1
-                    if test["name"] not in test_durations:
-                        test_durations[test["name"]] = 0
-                    test_durations[test["name"]] += duration
-                    total_duration += duration
-                    total_accuracy += accuracy
-
-                    # Update max/min duration and accuracy metrics
-                    if duration > self.summary["overall_metrics"]["max_duration_ms"]:
-                        self.summary["overall_metrics"]["max_duration_ms"] = duration
-                    if duration < self.summary["overall_metrics"]["min_duration_ms"]:
-                        self.summary["overall_metrics"]["min_duration_ms"] = duration
-                    if accuracy > self.summary["overall_metrics"]["max_accuracy"]:
-                        self.summary["overall_metrics"]["max_accuracy"] = accuracy
-                    if accuracy < self.summary["overall_metrics"]["min_accuracy"]:
-                        self.summary["overall_metrics"]["min_accuracy"] = accuracy
-                else:
-                    failed_tests += 1
+        Returns:
+            set: (task name, task hash) pairs.
+        """
+        return {
+            (test["name"], result["task_hash"])
+            for test in self.existing_data["tests"]
+            for result in test["results"]
+            if result.get("task_hash")
+            and (result.get("passed") or (result.get("metrics") or {}).get("attempts"))
+        }
 
-        self.summary["total_tests"] = len(self.existing_data.get("tests", []))
-        self.summary["total_results"] = sum(
-            len(test["results"]) for test in self.existing_data.get("tests", [])
+    def _index_test(self, test):
+        self._tests_by_name[test["name"]] = test
+        self._test_totals[test["name"]] = {
+            "passed": True,
+            "duration_ms": 0,
+            "accuracy": 0.0,
+        }
+
+    def _journal_test(self, test):
+        self.journal.append(
+            {
+                "type": "test",
+                "test": {
+                    "name": test["name"],
+                    "tags": test["tags"],
+                    "extra_info": test["extra_info"],
+                },
+            }
         )
+
+    def _journal_result(self, test, result):
+        self.journal.append({"type": "result", "test": test["name"], "result": result})
+
+    def _record_result(self, test, result):
+        """
+        Fold a single result into the running per-test, per-tag and summary aggregates.
+
+        Args:
+            test (dict): The test entry the result belongs to.
+            result (dict): The result entry.
+        """
+        test_totals = self._test_totals[test["name"]]
+        test_totals["passed"] = test_totals["passed"] and result["passed"]
+        test_totals["duration_ms"] += result["metrics"]["duration_ms"]
+        test_totals["accuracy"] += result["metrics"]["accuracy"]
+
+        duration = (
+            result["metrics"].get("duration_ms", 0) or 0
+        )  # Ensure duration is not None
+        accuracy = (
+            result["metrics"].get("accuracy", 0) or 0
+        )  # Ensure accuracy is not None
+
+        for name, phase_ms in (result["metrics"].get("phases") or {}).items():
+            bisect.insort(self._phase_durations.setdefault(name, []), phase_ms)
+            self._phase_totals[name] = self._phase_totals.get(name, 0) + phase_ms
+
+        for tag in test["tags"]:
+            tag_totals = self._tag_totals.setdefault(
+                tag, {"results": 0, "passed": 0, "failed": 0, "duration_ms": 0}
+            )
+            tag_totals["results"] += 1
+            tag_totals["passed" if result["passed"] else "failed"] += 1
+            tag_totals["duration_ms"] += duration
+
+        if result["passed"]:
+            self._totals["completed_tests"] += 1
+            self._totals["total_duration"] += duration
+            self._totals["total_accuracy"] += accuracy
+
+            # Update max/min duration and accuracy metrics
+            overall_metrics = self.summary["overall_metrics"]
+            if duration > overall_metrics["max_duration_ms"]:
+                overall_metrics["max_duration_ms"] = duration
+            if duration < overall_metrics["min_duration_ms"]:
+                overall_metrics["min_duration_ms"] = duration
+            if accuracy > overall_metrics["max_accuracy"]:
+                overall_metrics["max_accuracy"] = accuracy
+            if accuracy < overall_metrics["min_accuracy"]:
+                overall_metrics["min_accuracy"] = accuracy
+        else:
+            self._totals["failed_tests"] += 1
+
+    def _update_summary(self):
+        completed_tests = self._totals["completed_tests"]
+        failed_tests = self._totals["failed_tests"]
+
+        self.summary["total_tests"] = len(self.existing_data.get("tests", []))
+        self.summary["total_results"] = completed_tests + failed_tests
         self.summary["completed_tests"] = completed_tests
         self.summary["failed_tests"] = failed_tests
 
         if completed_tests > 0:
-            self.summary["average_duration_ms"] = total_duration / completed_tests
-            self.summary["average_accuracy"] = total_accuracy / completed_tests
+            self.summary["average_duration_ms"] = (
+                self._totals["total_duration"] / completed_tests
+            )
+            self.summary["average_accuracy"] = (
+                self._totals["total_accuracy"] / completed_tests
+            )
+
+        # Per-phase totals and percentiles over the results of every task
+        for name, durations in self._phase_durations.items():
+            phase_summary = {
+                "count": len(durations),
+                "total_ms": self._phase_totals[name],
+            }
+            for percent in PERCENTILES:
+                phase_summary[f"p{percent}_ms"] = percentile(durations, percent)
+            phase_summary["max_ms"] = durations[-1]
+            self.summary["phases"][name] = phase_summary
+
+    def tag_summary(self):
+        """
+        Get the pass/fail breakdown of the results per tag.
+
+        Returns:
+            dict: Per tag counts of results, passed and failed, and the average duration.
+        """
+        return {
+            tag: {
+                "results": totals["results"],
+                "passed": totals["passed"],
+                "failed": totals["failed"],
+                "average_duration_ms": totals["duration_ms"] / totals["results"],
+            }
+            for tag, totals in sorted(self._tag_totals.items())
+        }
 
     def save_to_file(self):
         """
@@ -225,11 +421,39 @@ class BenchmarkReport:
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
 
+        # Re-sum the accuracies once in report order: the running float total
+        # follows arrival order and can differ from a full rescan in the last bit
+        self._totals["total_accuracy"] = 0.0
+        agent_stats = {"cli_starts": 0, "cli_startup_saved_ms": 0}
+        for test in self.existing_data.get("tests", []):
+            for result in test["results"]:
+                for key in agent_stats:
+                    agent_stats[key] += result["metrics"].get(key, 0) or 0
+                if result["passed"]:
+                    self._totals["total_accuracy"] += (
+                        result["metrics"].get("accuracy", 0) or 0
+                    )
         self._update_summary()
 
-        # Save the updated data to a file
-        with open(self.output_path, "w") as file:
-            json.dump(self.existing_data, file, indent=4)
+        # Make sure every queued result reached the database
+        with span("db_drain"):
+            self.writer.drain()
+        self.existing_data["db_stats"] = get_db_stats()
+        self.existing_data["agent_stats"] = agent_stats
+
+        # Save the updated data to a file, never leaving a half-written report behind
+        self.journal.sync()
+        write_json_atomic(self.output_path, self.existing_data)
         print(f"Benchmark report saved to {self.output_path}")
 
         print(f"Benchmark summary:\n{json.dumps(self.summary)}")
+        print(f"Summary per tag:\n{json.dumps(self.tag_summary(), indent=4)}")
+        print(f"Database stats:\n{json.dumps(self.existing_data['db_stats'])}")
+        print(f"Agent CLI stats:\n{json.dumps(agent_stats)}")
+
+    def close(self):
+        """
+        Release the background writer and the journal once the report is saved.
+        """
+        self.writer.close()
+        self.journal.close()
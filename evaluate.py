@@ -1,13 +1,30 @@
 import argparse
+import asyncio
 import logging
+import multiprocessing
 import os
 import signal
 import sys
 from multiprocessing import Pool, cpu_count
 
 from benchmark_report import BenchmarkReport
-from task_processor import process_task
-from utils.file import remove_previous_folders, extract_tests_from_jsonl
+from task_processor import error_result, process_task, process_task_async
+from utils.dataset_cache import prune_dataset_cache
+from utils.file import (
+    TRASH_DIR_NAME,
+    remove_previous_folders,
+    extract_tests_from_jsonl,
+    task_fingerprint,
+)
+from utils.live_metrics import RunMetrics, init_worker
+from utils.preflight import preflight_tasks
+from utils.profiling import RunProfiler, profile_section, stop_inherited_profiler
+from utils.scheduler import (
+    ResourceLimits,
+    dispatch_with_limits,
+    schedule_longest_first,
+)
+from utils.tracing import export_trace, set_lane, start_trace
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -19,13 +36,76 @@ def process_task_wrapper(args):
     Wrapper function for parallel processing of tasks.
 
     Args:
-        args (tuple): Contains (task, dataset_dir, retry_limit, agent_config)
+        args (tuple): Contains the arguments of process_task, in order
+    """
+    # Pool workers are profiled task by task, when the run is
+    with profile_section("tasks"):
+        return process_task(*args)
+
+
+def init_pool_worker(heartbeats=None):
+    """
+    Initializer of the pool workers.
+
+    Args:
+        heartbeats (multiprocessing.Queue, optional): Where to report heartbeats, for the live metrics.
+    """
+    # Forked from a profiled parent, the worker profiles its own tasks instead
+    stop_inherited_profiler()
+    if heartbeats is not None:
+        init_worker(heartbeats)
+
+
+async def run_tasks_async(process_args, concurrency, limits):
+    """
+    Run tasks as coroutines in the current process, yielding results as they complete.
+
+    Args:
+        process_args (list): List of process_task argument tuples, the task first
+        concurrency (int): Maximum number of tasks in flight at once
+        limits (ResourceLimits): Concurrency limits per resource class
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    # Trace lanes of the concurrency slots, the coroutines share one thread
+    free_lanes = list(range(concurrency, 0, -1))
+
+    async def run(args):
+        # Wait for the resource class first, so waiting doesn't hold a slot
+        async with limits.slot(args[0]):
+            async with semaphore:
+                lane = free_lanes.pop()
+                set_lane(lane, f"slot {lane}")
+                try:
+                    return await process_task_async(*args)
+                finally:
+                    free_lanes.append(lane)
+
+    # Tasks start in creation order, the dispatch order of process_args:
+    # as_completed alone would wrap the coroutines in arbitrary order
+    tasks = [asyncio.create_task(run(args)) for args in process_args]
+    for next_result in asyncio.as_completed(tasks):
+        yield await next_result
+
+
+async def run_async_engine(
+    process_args, concurrency, limits, benchmark, fail_fast, metrics=None
+):
+    """
+    Drive the asyncio engine and hand each result over to handle_result.
+
+    Args:
+        process_args (list): List of process_task argument tuples, the task first
+        concurrency (int): Maximum number of tasks in flight at once
+        limits (ResourceLimits): Concurrency limits per resource class
+        benchmark (BenchmarkReport): The benchmark report instance
+        fail_fast (bool): Whether to exit immediately when a test fails
+        metrics (RunMetrics, optional): Live metrics of the run
     """
-    task, dataset_dir, retry_limit, agent_config = args
-    return process_task(task, dataset_dir, retry_limit, agent_config)
+    async for result_entry in run_tasks_async(process_args, concurrency, limits):
+        handle_result(result_entry, benchmark, fail_fast=fail_fast, metrics=metrics)
 
 
-def handle_result(result_entry, benchmark, task_id=None, fail_fast=False):
+def handle_result(result_entry, benchmark, task_id=None, fail_fast=False, metrics=None):
     """
     Handle the result of a task execution.
 
@@ -34,7 +114,10 @@ def handle_result(result_entry, benchmark, task_id=None, fail_fast=False):
         benchmark (BenchmarkReport): The benchmark report instance
         task_id (str, optional): The task ID for better error reporting
         fail_fast (bool): Whether to exit immediately when a test fails
+        metrics (RunMetrics, optional): Live metrics of the run
     """
+    if metrics is not None:
+        metrics.record_result(result_entry)
     benchmark.add_result(result_entry)
     if not result_entry["passed"] and fail_fast:
         task_info = f" {task_id}" if task_id else ""
@@ -46,6 +129,26 @@ def handle_result(result_entry, benchmark, task_id=None, fail_fast=False):
         sys.exit(1)
 
 
+def handle_rejected(rejected_results, benchmark, fail_fast=False, metrics=None):
+    """
+    Handle the results of the tasks rejected before their run.
+
+    Args:
+        rejected_results (list): Error results of the rejected tasks
+        benchmark (BenchmarkReport): The benchmark report instance
+        fail_fast (bool): Whether to exit immediately when a test fails
+        metrics (RunMetrics, optional): Live metrics of the run
+    """
+    for result_entry in rejected_results:
+        handle_result(
+            result_entry,
+            benchmark,
+            result_entry["task_id"],
+            fail_fast=fail_fast,
+            metrics=metrics,
+        )
+
+
 def main(
     jsonl_path,
     benchmark_config,
@@ -55,6 +158,11 @@ def main(
     fail_fast,
     parallel,
     description,
+    engine="pool",
+    resume=None,
+    metrics_port=None,
+    trace=None,
+    profile=False,
 ):
     """
     Main function to process tasks from a JSONL file.
@@ -67,52 +175,165 @@ def main(
         testfrom (str): Test ID to start running from.
         fail_fast (bool): Whether to exit immediately when a test fails.
         parallel (int): Number of parallel workers (0 means use CPU count, 1 means sequential).
+            With the asyncio engine, the number of tasks in flight (0 means all of them).
         description (str): Optional description of the benchmark run.
+        engine (str): Execution engine, "pool" (multiprocessing) or "asyncio".
+        resume (str, optional): Report or journal of a previous run to complete.
+        metrics_port (int, optional): Port of the live OpenMetrics endpoint, none if not set.
+        trace (str, optional): Path of a Trace Event Format file recording the run's timeline.
+        profile (bool): Whether to profile the harness, in this process and the workers.
     """
+    # Started first, the setup of the run is part of the profile
+    profiler = RunProfiler() if profile else None
+    if profiler is not None:
+        profiler.start()
+
     dataset_dir = "datasets"
+    # Old folders, and dataset extractions unused for a while, are deleted in
+    # the background while the tasks already run
+    prune_dataset_cache(os.path.join(dataset_dir, TRASH_DIR_NAME))
     remove_previous_folders(dataset_dir)
     os.makedirs(dataset_dir, exist_ok=True)
 
     # Load benchmark configuration
     benchmark = BenchmarkReport(
-        "AI Model Pair Benchmark", config_file=benchmark_config, description=description
+        "AI Model Pair Benchmark",
+        config_file=benchmark_config,
+        description=description,
+        resume_from=resume,
     )
-    tests = extract_tests_from_jsonl(jsonl_path)
-
-    # Filter tests based on testnum and testfrom
-    filtered_tests = []
-    is_test_from = False
-    for task in tests:
-        if testnum and task["id"] != testnum:
-            continue
-        if testfrom and not is_test_from:
-            if task["id"] == testfrom:
-                is_test_from = True
-            else:
+    # Closed whatever ends the run, --fail-fast included
+    metrics = None
+    trace_dir = None
+    try:
+        tests = extract_tests_from_jsonl(jsonl_path)
+        completed_tasks = benchmark.completed_tasks()
+
+        # Filter tests based on testnum and testfrom
+        filtered_tests = []
+        is_test_from = False
+        for task in tests:
+            if testnum and task["id"] != testnum:
+                continue
+            if testfrom and not is_test_from:
+                if task["id"] == testfrom:
+                    is_test_from = True
+                else:
+                    continue
+            task_hash = task_fingerprint(task, dataset_dir)
+            benchmark.add_test(task, task_hash)
+            if (task["id"], task_hash) in completed_tasks:
+                logging.info(f"Skipping {task['id']}, already completed in {resume}")
                 continue
-        filtered_tests.append(task)
-        benchmark.add_test(task)
+            filtered_tests.append(task)
+
+        # Fed by the results, rejected ones included, and the workers'
+        # heartbeats. Served from threads of this process, once the workers
+        # are forked
+        heartbeats = None
+        if metrics_port:
+            heartbeats = multiprocessing.Queue()
+            metrics = RunMetrics(len(filtered_tests))
+
+        # Broken tasks fail right away instead of after their agent ran. Their
+        # results are handed over once the workers are forked: storing a result
+        # starts the report's writer thread
+        rejected = preflight_tasks(filtered_tests, dataset_dir)
+        rejected_results = [
+            error_result(task, rejected[task["id"]])
+            for task in filtered_tests
+            if task["id"] in rejected
+        ]
+        filtered_tests = [task for task in filtered_tests if task["id"] not in rejected]
 
-    # Always use parallel processing
-    # Prepare arguments for parallel processing
-    process_args = [
-        (task, dataset_dir, benchmark.retry_limit, agent_config)
-        for task in filtered_tests
-    ]
+        if not filtered_tests:
+            logging.info("No tests to run")
+            handle_rejected(rejected_results, benchmark, fail_fast, metrics)
+            benchmark.save_to_file()
+            return
 
-    # Use specified number of workers or CPU count if parallel is 0
-    num_processes = parallel or cpu_count()
-    # Cap number of processes at number of tests
-    num_processes = min(num_processes, len(filtered_tests))
-    logging.info(f"Running {num_processes} processes in parallel")
+        if engine == "asyncio":
+            # Tasks mostly wait on the agent subprocess, so a single process can
+            # keep all of them in flight
+            num_workers = max(
+                1, min(parallel or len(filtered_tests), len(filtered_tests))
+            )
+        else:
+            # Use specified number of workers or CPU count if parallel is 0
+            # Cap number of processes at number of tests
+            num_workers = min(parallel or cpu_count(), len(filtered_tests))
 
-    with Pool(num_processes) as pool:
-        # Use imap_unordered for non-blocking iteration over results
-        for result_entry in pool.imap_unordered(process_task_wrapper, process_args):
-            handle_result(result_entry, benchmark, fail_fast=fail_fast)
+        # Dispatch the tasks expected to take longest first
+        filtered_tests = schedule_longest_first(filtered_tests, num_workers)
 
-    # Save the results and metadata
-    benchmark.save_to_file()
+        # Always use parallel processing
+        # Prepare arguments for parallel processing
+        retry_policy = benchmark.config.get("retry_policy")
+        agent_rate_limit = benchmark.config.get("agent_rate_limit")
+        early_verdict = benchmark.config.get("early_verdict", False)
+        process_args = [
+            (
+                task,
+                dataset_dir,
+                benchmark.retry_limit,
+                agent_config,
+                retry_policy,
+                agent_rate_limit,
+                early_verdict,
+            )
+            for task in filtered_tests
+        ]
+
+        # Heavy tasks (docker, terraform, ...) are capped per resource class
+        limits = ResourceLimits(benchmark.config.get("resource_limits"))
+
+        # Set before the workers are forked, they record their own spans
+        trace_dir = start_trace() if trace else None
+
+        if engine == "asyncio":
+            logging.info(f"Running {num_workers} tasks concurrently (asyncio engine)")
+            if metrics is not None:
+                metrics.serve(metrics_port, heartbeats)
+                # The tasks run in this process, which reports its own heartbeats
+                init_worker(heartbeats)
+            handle_rejected(rejected_results, benchmark, fail_fast, metrics)
+            asyncio.run(
+                run_async_engine(
+                    process_args, num_workers, limits, benchmark, fail_fast, metrics
+                )
+            )
+        else:
+            num_processes = num_workers
+            logging.info(f"Running {num_processes} processes in parallel")
+
+            # Workers report heartbeats only when the live metrics are served
+            with Pool(num_processes, init_pool_worker, (heartbeats,)) as pool:
+                if metrics is not None:
+                    metrics.serve(metrics_port, heartbeats)
+                handle_rejected(rejected_results, benchmark, fail_fast, metrics)
+                # Results are yielded as they complete, whatever the dispatch order
+                for result_entry in dispatch_with_limits(
+                    pool, process_task_wrapper, process_args, num_processes, limits
+                ):
+                    handle_result(
+                        result_entry, benchmark, fail_fast=fail_fast, metrics=metrics
+                    )
+
+        # Save the results and metadata
+        benchmark.save_to_file()
+    finally:
+        benchmark.close()
+        if metrics is not None:
+            metrics.close()
+        if trace_dir is not None:
+            export_trace(trace_dir, trace)
+        if profiler is not None:
+            profiler.export(report_profile_path(benchmark))
+
+
+def report_profile_path(benchmark):
+    """Path of the profile of a run, next to its benchmark report."""
+    return os.path.splitext(benchmark.output_path)[0] + ".prof"
 
 
 def signal_handler(sig, frame):
@@ -126,6 +347,11 @@ signal.signal(signal.SIGINT, signal_handler)
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("serve", "submit"):
+        from evaluation_server import cli
+
+        sys.exit(cli(sys.argv[1], sys.argv[2:]))
+
     parser = argparse.ArgumentParser(description="Evaluate tasks from a JSONL file.")
     parser.add_argument(
         "problem_file",
@@ -167,6 +393,14 @@ if __name__ == "__main__":
         help="Number of parallel workers. 0=use CPU count (default), N=N workers)",
         dest="parallel",
     )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["pool", "asyncio"],
+        default="pool",
+        help="Execution engine: pool=one process per worker (default), asyncio=coroutines in a single process",
+        dest="engine",
+    )
     parser.add_argument(
         "--description",
         type=str,
@@ -174,6 +408,33 @@ if __name__ == "__main__":
         help="Optional description of the benchmark run",
         dest="description",
     )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        help="Benchmark report (.json) or journal (.jsonl) of a previous run: skip its completed tasks and add the new results to it",
+        dest="resume",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve live OpenMetrics of the run on http://127.0.0.1:PORT/metrics",
+        dest="metrics_port",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Save a timeline of the run to this file, to open in Perfetto (Trace Event Format)",
+        dest="trace",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the harness in the parent and the workers, saved as a pstats file next to the report",
+        dest="profile",
+    )
     args = parser.parse_args()
 
     # Print all arguments
@@ -190,4 +451,9 @@ if __name__ == "__main__":
         args.fail_fast,
         args.parallel,
         args.description,
+        args.engine,
+        args.resume,
+        args.metrics_port,
+        args.trace,
+        args.profile,
     )
@@ -0,0 +1,345 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import uuid
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+
+from benchmark_report import BenchmarkReport
+from task_processor import error_result, process_task
+from utils.dataset_cache import prune_dataset_cache
+from utils.file import (
+    TRASH_DIR_NAME,
+    load_config,
+    remove_previous_folders,
+    extract_tests_from_jsonl,
+    task_fingerprint,
+)
+from utils.preflight import preflight_tasks
+from utils.scheduler import ResourceLimits, schedule_longest_first
+
+DEFAULT_SOCKET_PATH = os.path.join(".cache", "evaluate.sock")
+DATASET_DIR = "datasets"
+
+
+class EvaluationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Long-lived evaluation daemon listening on a local Unix socket.
+
+    The worker pool, database connections and cached run metadata stay warm
+    between submissions. Each submission gets its own benchmark report, and
+    a task already queued or running for another submission is not started
+    twice: its result is delivered to every submission waiting for it.
+    Runs of the same task id with another agent config or definition share
+    its workspace, so they wait for each other, and the resource_limits of
+    the benchmark configuration apply to the daemon's runs like to evaluate.py.
+
+    Protocol: the client sends one JSON line
+    {"problem_file": str, "tests": [str] | null, "agent_config": str, "description": str | null}
+    and receives JSON lines {"type": "result", "result": {...}} as tasks
+    complete, then {"type": "done", "report": str, "summary": {...}}.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, benchmark_config, parallel, retry_limit=3):
+        self.benchmark_config = benchmark_config
+        self.retry_limit = retry_limit
+        config = load_config(benchmark_config)
+        self.retry_policy = config.get("retry_policy")
+        self.agent_rate_limit = config.get("agent_rate_limit")
+        self.early_verdict = config.get("early_verdict", False)
+        self.limits = ResourceLimits(config.get("resource_limits"))
+        self.lock = threading.Lock()
+        # (task hash, agent config) -> queues of the submissions waiting for it
+        self.in_flight = {}
+        # (task, key, agent config) of the runs waiting for their workspace
+        # or a resource class slot, in submission order
+        self.pending = []
+        # Ids of the tasks running, their datasets/<id> workspace is in use
+        self.running_ids = set()
+
+        prune_dataset_cache(os.path.join(DATASET_DIR, TRASH_DIR_NAME))
+        remove_previous_folders(DATASET_DIR)
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        # Fork the workers before any handler thread exists
+        self.num_processes = parallel or cpu_count()
+        self.pool = Pool(self.num_processes)
+        logging.info(f"Started {self.num_processes} warm workers")
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        super().__init__(socket_path, SubmissionHandler)
+
+    def submit_task(self, task, task_hash, agent_config, results):
+        """
+        Queue a task on the worker pool, unless the same task is already queued or running.
+
+        Args:
+            task (dict): The task dictionary.
+            task_hash (str): Fingerprint of the task.
+            agent_config (str): Agent configuration to use.
+            results (queue.Queue): Where the result entry is delivered.
+
+        Returns:
+            bool: False if the submission was attached to an identical task in flight.
+        """
+        key = (task_hash, agent_config)
+        with self.lock:
+            if key in self.in_flight:
+                self.in_flight[key].append(results)
+                return False
+            self.in_flight[key] = [results]
+            self.pending.append((task, key, agent_config))
+            self._dispatch()
+        return True
+
+    def _dispatch(self):
+        """
+        Start the pending runs whose workspace is free and whose resource
+        classes have room. Called with the lock held.
+        """
+        for run in list(self.pending):
+            task, key, agent_config = run
+            if task["id"] in self.running_ids or not self.limits.can_start(task):
+                continue
+            self.pending.remove(run)
+            self.running_ids.add(task["id"])
+            self.limits.acquire(task)
+            self.pool.apply_async(
+                process_task,
+                (
+                    task,
+                    DATASET_DIR,
+                    self.retry_limit,
+                    agent_config,
+                    self.retry_policy,
+                    self.agent_rate_limit,
+                    self.early_verdict,
+                ),
+                callback=lambda result_entry, task=task, key=key: self._deliver(
+                    task, key, result_entry
+                ),
+                error_callback=lambda e, task=task, key=key: self._deliver(
+                    task, key, error_result(task, str(e))
+                ),
+            )
+
+    def _deliver(self, task, key, result_entry):
+        with self.lock:
+            waiting = self.in_flight.pop(key, [])
+            self.running_ids.discard(task["id"])
+            self.limits.release(task)
+            self._dispatch()
+        for results in waiting:
+            # Reports annotate the entry, each submission needs its own copy
+            results.put(copy.deepcopy(result_entry))
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.pool.terminate()
+
+
+class SubmissionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        try:
+            request = json.loads(self.rfile.readline())
+            tests = extract_tests_from_jsonl(request["problem_file"])
+        except (OSError, ValueError, KeyError) as e:
+            self._send({"type": "error", "message": f"Invalid submission: {e}"})
+            return
+        test_ids = request.get("tests")
+        agent_config = request.get("agent_config") or "CODING_AGENT"
+        if test_ids:
+            tests = [task for task in tests if task["id"] in test_ids]
+        if tests:
+            tests = schedule_longest_first(tests, server.num_processes)
+
+        date = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+        benchmark = BenchmarkReport(
+            "AI Model Pair Benchmark",
+            config_file=server.benchmark_config,
+            retry_limit=server.retry_limit,
+            description=request.get("description"),
+            # Several submissions can start within the same second
+            output_path=f"./results/benchmark_report_{date}_{uuid.uuid4().hex[:8]}.json",
+        )
+        results = queue.Queue()
+        rejected = preflight_tasks(tests, DATASET_DIR)
+        for task in tests:
+            task_hash = task_fingerprint(task, DATASET_DIR)
+            benchmark.add_test(task, task_hash)
+            if task["id"] in rejected:
+                results.put(error_result(task, rejected[task["id"]]))
+            elif not server.submit_task(task, task_hash, agent_config, results):
+                logging.info(f"{task['id']} is already in flight, sharing its result")
+
+        try:
+            for _ in tests:
+                result_entry = results.get()
+                benchmark.add_result(result_entry)
+                self._send({"type": "result", "result": result_entry})
+        finally:
+            benchmark.save_to_file()
+            benchmark.close()
+        self._send(
+            {
+                "type": "done",
+                "report": benchmark.output_path,
+                "summary": benchmark.summary,
+            }
+        )
+
+    def _send(self, message):
+        try:
+            self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        except OSError:
+            pass  # The client went away, the report is still saved
+
+
+def serve(socket_path, benchmark_config, parallel):
+    """
+    Run the evaluation daemon until interrupted.
+
+    Args:
+        socket_path (str): Path of the Unix socket to listen on.
+        benchmark_config (str): Path to the benchmark configuration file.
+        parallel (int): Number of warm workers (0 means use CPU count).
+    """
+    with EvaluationServer(socket_path, benchmark_config, parallel) as server:
+        logging.info(f"Evaluation server listening on {socket_path}")
+        server.serve_forever()
+
+
+def submit(socket_path, problem_file, tests, agent_config, description):
+    """
+    Submit tasks to a running evaluation daemon and print the results as they arrive.
+
+    Args:
+        socket_path (str): Path of the daemon's Unix socket.
+        problem_file (str): Path to the JSONL file containing the tasks.
+        tests (list): Test IDs to run, all tasks of the file if empty.
+        agent_config (str): Agent configuration to use.
+        description (str): Optional description of the benchmark run.
+
+    Returns:
+        int: 0 if every task passed, 1 otherwise.
+    """
+    request = {
+        "problem_file": os.path.abspath(problem_file),
+        "tests": tests,
+        "agent_config": agent_config,
+        "description": description,
+    }
+    all_passed = True
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        for line in client.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if message["type"] == "result":
+                result = message["result"]
+                all_passed = all_passed and result["passed"]
+                logging.info(
+                    f"Test {result['task_id']} | Passed: {result['passed']} | "
+                    f"{result['metrics']['duration_ms']}ms"
+                )
+            elif message["type"] == "done":
+                logging.info(f"Benchmark report saved to {message['report']}")
+                logging.info(f"Benchmark summary:\n{json.dumps(message['summary'])}")
+            else:
+                logging.error(message["message"])
+                return 1
+    return 0 if all_passed else 1
+
+
+def cli(command, argv):
+    """
+    Entry point of `evaluate.py serve` and `evaluate.py submit`.
+
+    Args:
+        command (str): "serve" or "submit".
+        argv (list): Remaining command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog=f"evaluate.py {command}",
+        description=(
+            "Run the evaluation daemon."
+            if command == "serve"
+            else "Submit tasks to the evaluation daemon."
+        ),
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=DEFAULT_SOCKET_PATH,
+        help="Path of the daemon's Unix socket.",
+        dest="socket_path",
+    )
+    if command == "serve":
+        parser.add_argument(
+            "--benchmark-config",
+            type=str,
+            help="Path to the benchmark configuration file.",
+            default="./config/benchmark_config.json",
+            dest="benchmark_config",
+        )
+        parser.add_argument(
+            "--parallel",
+            type=int,
+            default=0,
+            help="Number of warm workers. 0=use CPU count (default), N=N workers)",
+            dest="parallel",
+        )
+        args = parser.parse_args(argv)
+        serve(args.socket_path, args.benchmark_config, args.parallel)
+        return 0
+
+    parser.add_argument(
+        "problem_file",
+        type=str,
+        help="Path to the JSONL file containing the tasks.",
+        nargs="?",
+        default="./config/honest_benchmark.jsonl",
+    )
+    parser.add_argument(
+        "--test",
+        type=str,
+        action="append",
+        help="Test ID to run, can be repeated.",
+        default=None,
+        dest="tests",
+    )
+    parser.add_argument(
+        "--agent-config",
+        type=str,
+        help="Agent to run.",
+        default="CODING_AGENT",
+        dest="agent_config",
+    )
+    parser.add_argument(
+        "--description",
+        type=str,
+        default=None,
+        help="Optional description of the benchmark run",
+        dest="description",
+    )
+    args = parser.parse_args(argv)
+    return submit(
+        args.socket_path,
+        args.problem_file,
+        args.tests,
+        args.agent_config,
+        args.description,
+    )
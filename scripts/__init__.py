@@ -0,0 +1,26 @@
+"""
+Validators used as the test_command of the benchmark tasks.
+
+Registered validators are run by the harness in its warm validator worker
+(see utils/validator_service.py) instead of a new interpreter per
+validation. They keep the command line contract: the agent output comes in
+on stdin, arguments on the command line, and the verdict goes out as the
+exit code.
+"""
+
+# Script name -> path relative to the repository root
+VALIDATORS = {
+    "log_repairs_verification": "scripts/log_repairs_verification.py",
+    "test_flask_api": "scripts/test_flask_api.py",
+    "test_forbidden_keywords": "scripts/test_forbidden_keywords.py",
+    "test_lines_count": "scripts/test_lines_count.py",
+    "test_sentences_count": "scripts/test_sentences_count.py",
+    "test_sentiment": "scripts/test_sentiment.py",
+    "test_terraform_refactoring": "scripts/test_terraform_refactoring.py",
+    "test_unique_keys": "scripts/test_unique_keys.py",
+    "validate_attack_mongo_port": "scripts/validate_attack_mongo_port.py",
+}
+
+# Validators defining a StreamValidator, able to give a verdict from the
+# agent output while the agent still runs (see utils/early_verdict.py)
+STREAM_VALIDATORS = {"test_forbidden_keywords"}
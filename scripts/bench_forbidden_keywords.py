@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of scripts/test_forbidden_keywords.py against its previous
+implementation, which looped keywords x patterns over the whole text and
+lines x keywords x phrases with substring checks.
+
+Both run on the same synthetic agent transcripts; the verdicts must match.
+
+Usage: python scripts/bench_forbidden_keywords.py [--lines 20000] [--runs 5]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_forbidden_keywords import test_forbidden_keywords  # noqa: E402
+
+FORBIDDEN_COMMANDS = ["vim", "nano", "emacs", "sudo", "telnet", "ftp"]
+
+EXEMPT_PATTERNS = [
+    r"^\s*└\s*action.*",
+    r"^\s*■.*?(?:failed|executing).*",
+    r"command execution failed",
+    r"UPDATE AVAILABLE",
+    r"^\s*◇\s*",
+]
+
+TRANSCRIPT_LINES = [
+    "◇ Reasoning about the task",
+    "└ action: run_command",
+    "■ executing: ls -la",
+    "Command executed: ls -la",
+    "Command executed: cat README.md && echo done",
+    "total 48",
+    "-rw-r--r--  1 user  staff  1024 Jan  1 00:00 test.txt",
+    "The file was created successfully.",
+    "I'll use vim to edit the file",
+    "I could create it with echo instead.",
+    "UPDATE AVAILABLE: 0.2.0",
+    "command execution failed: permission denied",
+]
+
+# Lines changing the verdict, mixed in some transcripts
+VERDICT_LINES = [
+    "Command executed: vim test.txt",
+    "Command executed: /usr/bin/sudo apt install ftp",
+    "mkdir out && nano out/notes.md",
+    "we can use nano for this",
+    "using the telnet client",
+    "■ executing with the sudo command",
+]
+
+
+def legacy_test_forbidden_keywords(input_text, forbidden_keywords, exempt_patterns=None):
+    """The implementation replaced by the single pass scanner, unchanged."""
+    if input_text == "" or input_text is None:
+        print("No input text provided")
+        return False
+
+    input_lower = input_text.lower()
+
+    execution_attempts = False
+    for command in forbidden_keywords:
+        cmd_lower = command.lower()
+        execution_patterns = [
+            rf"Command executed: [/\w]*.*({cmd_lower})\s+\n?",
+            rf"&& .*{cmd_lower}\s+\n?",
+        ]
+
+        for pattern in execution_patterns:
+            match = re.search(pattern, input_lower, re.IGNORECASE)
+            if match:
+                print(f"Agent attempted to execute {command} command: {match.group(0)}")
+                execution_attempts = True
+
+    if execution_attempts:
+        return False
+
+    lines = input_text.split("\n")
+    found_keywords = []
+
+    phrases = [
+        "I'll use",
+        "let me use",
+        "I will use",
+        "we need to use",
+        "I can use",
+        "I should use",
+        "I'm going to use",
+        "we can use",
+        "would use",
+        "could use",
+        "using the",
+        "with the",
+    ]
+
+    for line in lines:
+        line_lower = line.lower()
+
+        if exempt_patterns:
+            exempt_line = False
+            for pattern in exempt_patterns:
+                if re.search(pattern, line_lower):
+                    exempt_line = True
+                    break
+            if exempt_line:
+                continue
+
+        for keyword in forbidden_keywords:
+            keyword_lower = keyword.lower()
+            for phrase in phrases:
+                phrase_pattern = f"{phrase} {keyword_lower}"
+                if phrase_pattern in line_lower:
+                    found_keywords.append(f"'{phrase} {keyword}' in: {line}")
+
+    if found_keywords:
+        print(f"Found forbidden keywords in non-exempted contexts:")
+        for found in found_keywords:
+            print(f"- {found}")
+        return False
+    else:
+        print(f"PASS: No forbidden keywords found in non-exempted contexts")
+        return True
+
+
+def make_transcript(rng, lines, verdict_lines):
+    transcript = [rng.choice(TRANSCRIPT_LINES) for _ in range(lines)]
+    for _ in range(verdict_lines):
+        transcript.insert(rng.randrange(len(transcript) + 1), rng.choice(VERDICT_LINES))
+    return "\n".join(transcript)
+
+
+def timed(function, text, runs):
+    best = float("inf")
+    for _ in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            verdict = function(text, FORBIDDEN_COMMANDS, EXEMPT_PATTERNS)
+            best = min(best, time.perf_counter() - start_time)
+    return verdict, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=20000, help="Lines per transcript.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measure, the best is kept.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    for verdict_lines in (0, 1, 5):
+        text = make_transcript(rng, args.lines, verdict_lines)
+        legacy_verdict, legacy_s = timed(legacy_test_forbidden_keywords, text, args.runs)
+        verdict, scanner_s = timed(test_forbidden_keywords, text, args.runs)
+        mismatches += legacy_verdict != verdict
+        print(
+            f"{args.lines} lines, {verdict_lines} verdict lines: "
+            f"legacy {legacy_s * 1000:.1f}ms, single pass {scanner_s * 1000:.1f}ms "
+            f"({legacy_s / scanner_s:.1f}x), verdicts {legacy_verdict}/{verdict}"
+        )
+
+    # Small transcripts exercise the edge cases, verdicts only
+    for _ in range(2000):
+        text = make_transcript(rng, rng.randrange(0, 8), rng.randrange(0, 2))
+        text += rng.choice(["", "\n", " ", "\n\n  "])
+        with contextlib.redirect_stdout(io.StringIO()):
+            mismatches += legacy_test_forbidden_keywords(
+                text, FORBIDDEN_COMMANDS, EXEMPT_PATTERNS
+            ) != test_forbidden_keywords(text, FORBIDDEN_COMMANDS, EXEMPT_PATTERNS)
+
+    print(f"Verdict mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,200 @@
 import sys
 import re
 
+DEFAULT_FORBIDDEN_COMMANDS = ["vim", "nano", "emacs", "sudo", "telnet"]
+
+STDIN_BLOCK_SIZE = 256 * 1024
+
+# Phrases that indicate the agent is just talking about using commands
+# rather than executing them
+PHRASES = [
+    "I'll use",
+    "let me use",
+    "I will use",
+    "we need to use",
+    "I can use",
+    "I should use",
+    "I'm going to use",
+    "we can use",
+    "would use",
+    "could use",
+    "using the",
+    "with the",
+]
+
+
+def execution_patterns(command):
+    """
+    Patterns of a command execution attempt, showing the agent is actually
+    trying to use the command rather than talking about it.
+    """
+    cmd_lower = command.lower()
+    return [
+        rf"Command executed: [/\w]*.*({cmd_lower})\s+\n?",
+        rf"&& .*{cmd_lower}\s+\n?",
+        # rf"executing.*?{cmd_lower}",
+    ]
+
+
+def compile_execution_regex(commands, ignore_case=True):
+    """
+    Compile the execution patterns of all the commands into one regex, so a
+    line is scanned once whatever the number of commands.
+
+    Without ignore_case, the regex is meant for lowercased ASCII text: it
+    then matches exactly like the case insensitive one, several times faster.
+    """
+    if not commands:
+        return re.compile(r"(?!)")  # Nothing is forbidden, never matches
+    # Commands are regex fragments, like in execution_patterns()
+    alternatives = "|".join(f"(?:{command.lower()})" for command in commands)
+    return re.compile(
+        rf"command executed: [/\w]*.*(?:{alternatives})\s|&& .*(?:{alternatives})\s",
+        re.IGNORECASE if ignore_case else 0,
+    )
+
+
+def _line_bounds(text, position):
+    """Get the start and end, newline included, of the line of text at position."""
+    start = text.rfind("\n", 0, position) + 1
+    end = text.find("\n", position)
+    return start, len(text) if end == -1 else end + 1
+
+
+class ForbiddenKeywordScanner:
+    """
+    Single pass over the input, block by block, with every pattern compiled once.
+
+    The execution patterns of all the keywords are combined into one regex,
+    and the phrases are only looked for around the occurrences of the
+    keywords. None of the patterns spans lines, so a block of lines is
+    scanned at once; the individual lines and patterns are only looked at
+    where something matched, to report exactly what was found.
+    """
+
+    def __init__(self, forbidden_keywords, exempt_patterns=None):
+        self.execution_regex = compile_execution_regex(forbidden_keywords)
+        self.ascii_keywords = all(
+            keyword.lower().isascii() for keyword in forbidden_keywords
+        )
+        self.ascii_execution_regex = compile_execution_regex(
+            forbidden_keywords, ignore_case=False
+        )
+        self.execution_patterns = [
+            (command, re.compile(pattern, re.IGNORECASE))
+            for command in forbidden_keywords
+            for pattern in execution_patterns(command)
+        ]
+        self.exempt_regex = None
+        if exempt_patterns:
+            self.exempt_regex = re.compile(
+                "|".join(f"(?:{pattern})" for pattern in exempt_patterns)
+            )
+        # Lines are lowercased, phrases with uppercase letters can't match them
+        self.phrase_keywords = [
+            (f"{phrase} {keyword.lower()}", f"'{phrase} {keyword}'")
+            for keyword in forbidden_keywords
+            for phrase in PHRASES
+            if f"{phrase} {keyword.lower()}" == f"{phrase} {keyword.lower()}".lower()
+        ]
+        # Every phrase ends with a space and its keyword
+        self.keyword_needles = {needle[needle.rindex(" "):] for needle, _ in self.phrase_keywords}
+        self.has_input = False
+        self.execution_attempts = {}  # Index in execution_patterns -> matched text
+        self.found_keywords = []
+
+    def feed(self, text):
+        """
+        Scan the next block of the input.
+
+        Args:
+            text (str): Complete lines, ending with their newline, except at the end of the input.
+        """
+        if not text:
+            return
+        self.has_input = True
+        text_lower = text.lower()
+        self._find_execution_attempts(text_lower)
+        # An execution attempt fails the test whatever the phrases say
+        if not self.execution_attempts:
+            self._find_phrases(text, text_lower)
+
+    def _find_execution_attempts(self, text_lower):
+        regex = self.execution_regex
+        if self.ascii_keywords and text_lower.isascii():
+            regex = self.ascii_execution_regex
+        position = 0
+        while len(self.execution_attempts) < len(self.execution_patterns):
+            match = regex.search(text_lower, position)
+            if not match:
+                break
+            start, position = _line_bounds(text_lower, match.start())
+            line_lower = text_lower[start:position]
+            for index, (command, pattern) in enumerate(self.execution_patterns):
+                if index not in self.execution_attempts:
+                    match = pattern.search(line_lower)
+                    if match:
+                        self.execution_attempts[index] = match.group(0)
+
+    def _find_phrases(self, text, text_lower):
+        line_starts = set()
+        for needle in self.keyword_needles:
+            position = text_lower.find(needle)
+            while position != -1:
+                start, end = _line_bounds(text_lower, position)
+                line_starts.add(start)
+                position = text_lower.find(needle, end)
+        if not line_starts:
+            return
+        lines = None
+        line_number = 0
+        previous_start = 0
+        for start in sorted(line_starts):
+            # Lowercasing can change lengths, lines are matched by number
+            line_number += text_lower.count("\n", previous_start, start)
+            previous_start = start
+            end = text_lower.find("\n", start)
+            line_lower = text_lower[start:] if end == -1 else text_lower[start:end]
+            # Skip exempt lines like reasoning steps
+            if self.exempt_regex and self.exempt_regex.search(line_lower):
+                continue
+            for needle, description in self.phrase_keywords:
+                if needle in line_lower:
+                    if lines is None:
+                        lines = text.split("\n")
+                    self.found_keywords.append(f"{description} in: {lines[line_number]}")
+
+    def verdict(self):
+        """
+        Report what was found and give the verdict.
+
+        Returns:
+            bool: True if no forbidden keywords are found in non-exempt contexts, False otherwise
+        """
+        # If the input text is empty, return False
+        if not self.has_input:
+            print("No input text provided")
+            return False
+
+        # If we found execution attempts, the agent is trying to use the command (which is wrong)
+        if self.execution_attempts:
+            for index in sorted(self.execution_attempts):
+                command = self.execution_patterns[index][0]
+                print(
+                    f"Agent attempted to execute {command} command: "
+                    f"{self.execution_attempts[index]}"
+                )
+            return False
+
+        if self.found_keywords:
+            print(f"Found forbidden keywords in non-exempted contexts:")
+            for found in self.found_keywords:
+                print(f"- {found}")
+            return False
+        else:
+            print(f"PASS: No forbidden keywords found in non-exempted contexts")
+            return True
+
 
 def test_forbidden_keywords(input_text, forbidden_keywords, exempt_patterns=None):
     """
@@ -16,85 +210,41 @@ def test_forbidden_keywords(input_text, forbidden_keywords, exempt_patterns=None
     Returns:
         bool: True if no forbidden keywords are found in non-exempt contexts, False otherwise
     """
-    # If the input text is empty, return False
-    if input_text == "" or input_text is None:
-        print("No input text provided")
-        return False
-
-    # Convert to lowercase for case-insensitive matching
-    input_lower = input_text.lower()
-
-    # Check for command execution attempts that indicate the agent is actually trying to use any of the commands
-    execution_attempts = False
-    for command in forbidden_keywords:
-        cmd_lower = command.lower()
-        execution_patterns = [
-            rf"Command executed: [/\w]*.*({cmd_lower})\s+\n?",
-            rf"&& .*{cmd_lower}\s+\n?",
-            # rf"executing.*?{cmd_lower}",
-        ]
+    scanner = ForbiddenKeywordScanner(forbidden_keywords, exempt_patterns)
+    scanner.feed(input_text)
+    return scanner.verdict()
 
-        for pattern in execution_patterns:
-            match = re.search(pattern, input_lower, re.IGNORECASE)
-            if match:
-                print(f"Agent attempted to execute {command} command: {match.group(0)}")
-                execution_attempts = True
-
-    # If we found execution attempts, the agent is trying to use the command (which is wrong)
-    if execution_attempts:
-        return False
-
-    # Split input into lines for line-by-line analysis
-    lines = input_text.split("\n")
-    found_keywords = []
-
-    # Create phrase patterns that indicate the agent is just talking about using commands
-    # rather than executing them
-    phrases = [
-        "I'll use",
-        "let me use",
-        "I will use",
-        "we need to use",
-        "I can use",
-        "I should use",
-        "I'm going to use",
-        "we can use",
-        "would use",
-        "could use",
-        "using the",
-        "with the",
-    ]
 
-    for line in lines:
-        line_lower = line.lower()
+class StreamValidator:
+    """
+    Early verdict while the agent still runs: an execution attempt of a
+    forbidden command fails the task whatever comes next.
 
-        # Skip exempt lines like reasoning steps
-        if exempt_patterns:
-            exempt_line = False
-            for pattern in exempt_patterns:
-                if re.search(pattern, line_lower):
-                    exempt_line = True
-                    break
-            if exempt_line:
-                continue
+    A line is only checked once a later line with content arrived, so a
+    command at the very end of the output, which the full check sees
+    without its trailing newline, gets the same verdict as in main().
+    """
 
-        # Check for forbidden keywords in non-exempt lines
-        for keyword in forbidden_keywords:
-            keyword_lower = keyword.lower()
-            for phrase in phrases:
-                # Look for phrases like "I'll use vim" or "using the vim editor"
-                phrase_pattern = f"{phrase} {keyword_lower}"
-                if phrase_pattern in line_lower:
-                    found_keywords.append(f"'{phrase} {keyword}' in: {line}")
-
-    if found_keywords:
-        print(f"Found forbidden keywords in non-exempted contexts:")
-        for found in found_keywords:
-            print(f"- {found}")
-        return False
-    else:
-        print(f"PASS: No forbidden keywords found in non-exempted contexts")
-        return True
+    def __init__(self, args):
+        forbidden_commands = args[0].split(",") if args else DEFAULT_FORBIDDEN_COMMANDS
+        self.execution_regex = compile_execution_regex(forbidden_commands)
+        self.pending = ""
+
+    def feed(self, line):
+        """
+        Args:
+            line (str): Next line of the agent output, with its newline.
+
+        Returns:
+            str: "FAIL" once an execution attempt is found, None otherwise.
+        """
+        if not line.strip():
+            self.pending += line
+            return None
+        pending, self.pending = self.pending, line
+        if self.execution_regex.search(pending.lower()):
+            return "FAIL"
+        return None
 
 
 def main():
@@ -105,7 +255,7 @@ def main():
         print(f"Checking for forbidden commands: {', '.join(forbidden_commands)}")
     else:
         # Default list if no args provided
-        forbidden_commands = ["vim", "nano", "emacs", "sudo", "telnet"]
+        forbidden_commands = DEFAULT_FORBIDDEN_COMMANDS
         print(f"No commands specified, using defaults: {', '.join(forbidden_commands)}")
 
     # Define patterns that exempt a line from keyword checking
@@ -118,11 +268,11 @@ def main():
         r"^\s*◇\s*",  # Agent output markers
     ]
 
-    # Read from stdin
-    input_text = sys.stdin.read()
-
-    # Test for forbidden keywords
-    result = test_forbidden_keywords(input_text, forbidden_commands, exempt_patterns)
+    # Read stdin in blocks of complete lines, in a single pass
+    scanner = ForbiddenKeywordScanner(forbidden_commands, exempt_patterns)
+    for lines in iter(lambda: sys.stdin.readlines(STDIN_BLOCK_SIZE), []):
+        scanner.feed("".join(lines))
+    result = scanner.verdict()
 
     # Exit with appropriate status code
     sys.exit(0 if result else 1)
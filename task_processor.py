@@ -1,23 +1,27 @@
+import asyncio
 import os
-import signal
-import sys
+import shutil
+import tempfile
 import time
-import zipfile
-import struct  # Required by some subprocesses
 import subprocess
 import logging
 
-from utils.command import run_command
+from utils.agent_manager import AgentManager
+from utils.dataset_cache import materialize_dataset
+from utils.early_verdict import load_stream_validator
+from utils.live_metrics import heartbeat
+from utils.output_buffer import OutputBuffer
+from utils.rate_limiter import AgentRateLimiter
+from utils.retry import VALIDATION_ERROR, RetryPolicy
+from utils.timing import RATE_LIMIT, RETRY_WAIT, VALIDATOR, WORKSPACE, PhaseTimer, merge_phases
+from utils.tracing import record_span
+from utils.validator_service import run_test_command_async, run_test_script_async
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 
-def flush_agents():
-    run_command("@2501 agents --flush")
-
-
 def get_cli_version():
     """Get the CLI version by running the CLI version command."""
     result = subprocess.run(
@@ -34,7 +38,15 @@ def get_engine_version():
     return result.stdout.strip()
 
 
-def process_task(task, files_dir, max_retries=3, agent_config="CODING_AGENT"):
+def process_task(
+    task,
+    files_dir,
+    max_retries=3,
+    agent_config="CODING_AGENT",
+    retry_policy=None,
+    agent_rate_limit=None,
+    early_verdict=False,
+):
     """
     Process a single task and record the result in the benchmark report.
 
@@ -43,25 +55,68 @@ def process_task(task, files_dir, max_retries=3, agent_config="CODING_AGENT"):
         files_dir (str): The directory containing the files.
         max_retries (int): Maximum number of retries for the task.
         agent_config (str): The agent configuration to use.
+        retry_policy (dict, optional): The "retry_policy" section of the benchmark configuration.
+        agent_rate_limit (dict, optional): The "agent_rate_limit" section of the benchmark configuration.
+        early_verdict (bool): Whether stream validators may end the task before the agent is done.
+    """
+    return asyncio.run(
+        process_task_async(
+            task,
+            files_dir,
+            max_retries,
+            agent_config,
+            retry_policy,
+            agent_rate_limit,
+            early_verdict,
+        )
+    )
+
+
+async def process_task_async(
+    task,
+    files_dir,
+    max_retries=3,
+    agent_config="CODING_AGENT",
+    retry_policy=None,
+    agent_rate_limit=None,
+    early_verdict=False,
+):
+    """
+    Coroutine version of process_task, used directly by the asyncio engine.
+
+    Args:
+        task (dict): The task dictionary.
+        files_dir (str): The directory containing the files.
+        max_retries (int): Maximum number of retries for the task.
+        agent_config (str): The agent configuration to use.
+        retry_policy (dict, optional): The "retry_policy" section of the benchmark configuration.
+        agent_rate_limit (dict, optional): The "agent_rate_limit" section of the benchmark configuration.
+        early_verdict (bool): Whether stream validators may end the task before the agent is done.
     """
-    start_time = time.time()
+    start_time = time.monotonic()
     task_id = task["id"]
     input_command = task["input"]
     test_command = task.get("test_command", "")
     test_script = task.get("test_script", "")
 
     logging.info(f"Processing task {task_id}")
+    heartbeat("start", task_id)
 
-    # Unzip the corresponding zip file
+    # The workspace is created from the corresponding zip file, if any
     zip_path = os.path.join(files_dir, f"{task_id}.zip")
-    if os.path.exists(zip_path):
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(files_dir)
-        logging.info(f"Unzipped file: {zip_path}")
-    else:
-        # If the zip file does not exist, create the dir
-        os.makedirs(os.path.join(files_dir, task_id), exist_ok=True)
+    if not os.path.exists(zip_path):
+        zip_path = None
+    workspace_dir = os.path.join(files_dir, task_id)
 
+    policy = RetryPolicy(retry_policy)
+    limiter = AgentRateLimiter(agent_rate_limit)
+    # Initialized by the first prompt of each workspace, flushed at the end
+    agent = AgentManager(workspace_dir, agent_config)
+    rate_limit_wait_ms = 0
+    early_verdict_output = None
+    # Agent output past the memory cap spills here, outside the workspace
+    output_dir = tempfile.mkdtemp(prefix=f"{task_id}-output-")
+    attempt_metrics = []
     attempts = 0
     passed = False
     error_message = None
@@ -76,77 +131,114 @@ def process_task(task, files_dir, max_retries=3, agent_config="CODING_AGENT"):
     else:
         input_command += " " + prompt_limiter
 
-    while attempts < max_retries:
-        attempts += 1
-        agent_stdout = None  # Initialize agent_stdout
-        try:
-            if attempts > 1:
-                logging.warning(f"Retrying task {task_id} (attempt {attempts})")
-            flush_agents()
-
-            # Execute the input command
-            logging.info(f'Executing command: @2501 "{input_command}"')
-            command_to_run = f'cd {files_dir}/{task_id} && @2501 init --config {agent_config} && TFZO_DISABLE_SPINNER=true @2501 "{input_command}"'
-            logging.info(f"Executing command: {command_to_run}")
-
-            # Capture stdout from the agent command
-            agent_stdout, stderr, returncode = run_command(command_to_run)
-            logging.info(f"Command returncode: {returncode} | stdout: {agent_stdout}")
-            if stderr.strip():
-                logging.error(f"Command stderr: {stderr}")
-
-            if returncode != 0:
-                logging.error(
-                    f"Command failed with return code {returncode} | Error output: {stderr}"
-                )
-                continue
+    try:
+        while attempts < max_retries:
+            attempts += 1
+            attempt_start_time = time.monotonic()
+            agent_stdout = OutputBuffer(
+                os.path.join(output_dir, f"{attempts}.stdout")
+            )
+            stderr = OutputBuffer(os.path.join(output_dir, f"{attempts}.stderr"))
+            watcher = load_stream_validator(test_command) if early_verdict else None
+            timer = PhaseTimer()
+            failure_class = None
+            validating = False
+            try:
+                if attempts > 1:
+                    logging.warning(f"Retrying task {task_id} (attempt {attempts})")
+                # Every attempt starts from a clean workspace
+                with timer.phase(WORKSPACE):
+                    await asyncio.to_thread(
+                        materialize_dataset, zip_path, workspace_dir
+                    )
+                # The agent of the replaced workspace remembers the failed attempt
+                agent.reset()
 
-            test_local = locals()
-            passed = False
-            output = None
+                # Execute the input command
+                logging.info(f'Executing command: @2501 "{input_command}"')
 
-            # Run the test command or script
-            if test_command:
+                # Capture stdout from the agent command, once the model pair's
+                # rate limiter lets it start
+                async with limiter.slot() as waited_ms:
+                    rate_limit_wait_ms += waited_ms
+                    timer.add(RATE_LIMIT, waited_ms)
+                    returncode = await agent.run_prompt(
+                        input_command, agent_stdout, stderr, watcher, timer
+                    )
+                # Only the end of long outputs is logged
                 logging.info(
-                    f"Executing script at {test_command}, passing agent stdout as stdin"
+                    f"Command returncode: {returncode} | "
+                    f"stdout: {agent_stdout.preview()}"
                 )
-                # Pass the captured agent_stdout as input to the test command
-                out, err, code = run_command(test_command, input_data=agent_stdout)
-                logging.info(f"Test command returncode: {code} | stdout: {out}")
-                if err.strip():
-                    logging.error(f"Test command stderr: {err}")
-                passed = int(code) == 0
-                output = passed and "PASS" or "FAIL"
-            elif test_script:
-                logging.info(f"Executing in-line test script")
-                # Note: Passing stdin to exec is not straightforward.
-                # agent_stdout is available in the 'test_local' dict if needed by the script.
-                test_local["agent_stdout"] = agent_stdout
-                signal.signal(signal.SIGALRM, signal_handler)
-                signal.alarm(120)  # 2 minutes timeout
-                try:
-                    exec(test_script, globals(), test_local)
-                    output = test_local.get("output", "FAIL").strip().upper()
+                if stderr.size:
+                    logging.error(f"Command stderr: {stderr.preview()}")
+
+                if watcher is not None and watcher.verdict:
+                    # The validator already decided, the agent was stopped
+                    output = watcher.verdict
                     passed = output == "PASS"
-                except KeyboardInterrupt:
-                    logging.warning("Interrupted! Terminating.")
-                    sys.exit(0)
-                finally:
-                    signal.alarm(0)
+                    early_verdict_output = output
+                    logging.info(f"Test {task_id} | Passed: {passed} (early verdict)")
+                elif returncode != 0:
+                    logging.error(
+                        f"Command failed with return code {returncode} | Error output: {stderr.preview()}"
+                    )
+                    failure_class = policy.classify_agent_failure(
+                        returncode, stderr.preview()
+                    )
+                else:
+                    validating = True
+                    passed = await run_validator(
+                        task,
+                        agent_stdout.path(),
+                        timer,
+                        policy,
+                        max_runs=max_retries,
+                    )
+                    logging.info(f"Test {task_id} | Passed: {passed}")
 
-            logging.info(f"Test {task_id} | Passed: {passed}")
-            break
+            except Exception as e:
+                logging.error(f"Test failed: {str(e)}")
+                error_message = str(e)
+                failure_class = policy.classify_exception(e, validating)
 
-        except Exception as e:
-            logging.error(f"Test failed: {str(e)}")
-            error_message = str(e)
-            # Retry only it's a server error
-            if "The server has returned an error" in str(e):
-                continue
-            else:
+            attempt_entry = {
+                "attempt": attempts,
+                "class": failure_class or (passed and "passed" or "failed"),
+                "wait_ms": 0,
+                "phases": timer.phases,
+            }
+            attempt_metrics.append(attempt_entry)
+            record_span(
+                "attempt",
+                attempt_start_time,
+                task=task_id,
+                attempt=attempts,
+                result=attempt_entry["class"],
+            )
+            # A verdict ends the task, failures are retried according to the
+            # policy, except those of the validator, retried by run_validator
+            if failure_class in (None, VALIDATION_ERROR):
+                break
+            if not policy.should_retry(failure_class):
+                break
+            if attempts >= max_retries:
                 break
+            delay = policy.backoff(failure_class, attempts)
+            attempt_entry["wait_ms"] = int(delay * 1000)
+            # The wait before the next attempt counts in the phases of this one
+            timer.add(RETRY_WAIT, attempt_entry["wait_ms"])
+            logging.warning(
+                f"Attempt {attempts} of task {task_id} failed ({failure_class}), "
+                f"retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+    finally:
+        # Also when the task is cancelled or crashes
+        shutil.rmtree(output_dir, ignore_errors=True)
+        await agent.close()
 
-    duration_ms = int((time.time() - start_time) * 1000)
+    duration_ms = int((time.monotonic() - start_time) * 1000)
     accuracy = 1.0 / attempts if passed else 0.0
 
     if accuracy is None:
@@ -162,15 +254,96 @@ def process_task(task, files_dir, max_retries=3, agent_config="CODING_AGENT"):
         "metrics": {
             "duration_ms": duration_ms,
             "accuracy": accuracy,
+            "attempts": attempt_metrics,
+            "phases": merge_phases(entry["phases"] for entry in attempt_metrics),
+            "rate_limit_wait_ms": rate_limit_wait_ms,
+            "cli_starts": agent.cli_starts,
+            "cli_startup_saved_ms": agent.startup_saved_ms(),
+            "early_verdict": early_verdict_output,
         },
         "error_message": error_message,
     }
+    record_span("task", start_time, task=task_id, passed=passed, attempts=attempts)
+    heartbeat("finish", task_id)
     return result_entry
 
 
-def signal_handler(signum, frame):
-    raise TimeoutException(f"Timed out! {signum}")
+async def run_validator(task, output_path, timer, policy, max_runs=1):
+    """
+    Validate the agent's work with the task's test_command or test_script.
+
+    A validator that raises is run again on the same agent output, up to
+    max_runs times, if the policy retries validation errors. The agent
+    itself is never run again for a failure of its validator.
+
+    Args:
+        task (dict): The task dictionary.
+        output_path (str): File holding the output of the agent.
+        timer (PhaseTimer): Timer of the attempt.
+        policy (RetryPolicy): Retry policy of the task.
+        max_runs (int): Maximum number of validator runs.
+
+    Returns:
+        bool: Whether the task passed.
+
+    Raises:
+        Exception: The error of the last validator run.
+    """
+    runs = 0
+    while True:
+        runs += 1
+        try:
+            return await _run_validator_once(task, output_path, timer)
+        except Exception as e:
+            if runs >= max_runs or not policy.should_retry(VALIDATION_ERROR):
+                raise
+            logging.warning(
+                f"Validator of task {task['id']} failed ({e}), "
+                f"running it again on the same agent output"
+            )
 
 
-class TimeoutException(Exception):
-    pass
+async def _run_validator_once(task, output_path, timer):
+    test_command = task.get("test_command")
+    test_script = task.get("test_script")
+    if test_command:
+        logging.info(
+            f"Executing script at {test_command}, passing agent stdout as stdin"
+        )
+        # Pass the captured agent_stdout as input to the test command
+        with timer.phase(VALIDATOR):
+            out, err, code = await run_test_command_async(
+                test_command, input_path=output_path
+            )
+        logging.info(f"Test command returncode: {code} | stdout: {out}")
+        if err.strip():
+            logging.error(f"Test command stderr: {err}")
+        return int(code) == 0
+    if test_script:
+        logging.info(f"Executing in-line test script")
+        # agent_stdout is available to the script, which sets `output`
+        with timer.phase(VALIDATOR):
+            output = await run_test_script_async(test_script, input_path=output_path)
+        return output == "PASS"
+    return False
+
+
+def error_result(task, error_message):
+    """
+    Result entry of a task that failed without running, e.g. rejected by the preflight checks.
+
+    Args:
+        task (dict): The task dictionary.
+        error_message (str): Why the task failed.
+    """
+    return {
+        "task_id": task["id"],
+        "task_name": task["id"],
+        "input_command": task["input"],
+        "script": task.get("test_command") or task.get("test_script"),
+        "passed": False,
+        "retries": 0,
+        "metrics": {"duration_ms": 0, "accuracy": 0.0},
+        "error_message": error_message,
+    }
+
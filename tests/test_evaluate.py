@@ -0,0 +1,29 @@
+import asyncio
+
+import evaluate
+from utils.scheduler import ResourceLimits
+
+
+def test_run_tasks_async_starts_tasks_in_dispatch_order(monkeypatch):
+    started = []
+
+    async def fake_process_task_async(task, *args):
+        started.append(task["id"])
+        await asyncio.sleep(0.001 * (task["id"] % 3))
+        return {"task_id": task["id"]}
+
+    monkeypatch.setattr(evaluate, "process_task_async", fake_process_task_async)
+    process_args = [({"id": index, "tags": []},) for index in range(12)]
+
+    async def collect():
+        return [
+            result
+            async for result in evaluate.run_tasks_async(
+                process_args, 3, ResourceLimits()
+            )
+        ]
+
+    results = asyncio.run(collect())
+
+    assert started == list(range(12))
+    assert sorted(result["task_id"] for result in results) == list(range(12))
@@ -0,0 +1,133 @@
+"""
+Lifecycle of the @2501 agent of a task.
+
+Each attempt used to run three CLI commands: a global `@2501 agents --flush`,
+then `@2501 init` and then the prompt. Every one of them is a Node cold
+start, and the global flush could remove the agents of tasks running in
+parallel. The manager initializes the task's agent once per workspace and
+reuses it for every prompt run against that workspace. It only flushes the
+agents of that workspace, and counts the CLI starts it saved.
+
+An attempt that re-creates the workspace calls reset(): the agent was
+initialized against the replaced workspace and remembers the failed
+attempt, so the next prompt flushes it and initializes a new one.
+"""
+
+import logging
+import os
+import time
+
+from utils.command import run_command_async, run_command_streaming
+from utils.timing import AGENT, AGENT_INIT, PhaseTimer
+
+# CLI commands per attempt without the manager: flush, init and the prompt
+CLI_STARTS_PER_ATTEMPT = 3
+
+
+class AgentManager:
+    """
+    The @2501 agent of one task run.
+
+    The CLI has no long-lived session mode, so every command is still its
+    own process: the manager only runs fewer of them.
+    """
+
+    def __init__(self, workspace_dir, agent_config):
+        self.workspace_dir = workspace_dir
+        self.agent_config = agent_config
+        self.initialized = False
+        self.cli_starts = 0
+        self.prompts = 0
+        self.lifecycle_ms = 0
+
+    async def _run_lifecycle_command(self, command):
+        start_time = time.monotonic()
+        stdout, stderr, returncode = await run_command_async(
+            f"cd {self.workspace_dir} && {command}"
+        )
+        self.cli_starts += 1
+        self.lifecycle_ms += int((time.monotonic() - start_time) * 1000)
+        return stdout, stderr, returncode
+
+    def reset(self):
+        """
+        Create a new agent before the next prompt, once the workspace was re-created.
+        """
+        self.initialized = False
+
+    async def _flush(self):
+        # Scoped to this workspace: the agents of parallel tasks are left alone
+        workspace = os.path.abspath(self.workspace_dir)
+        await self._run_lifecycle_command(f"@2501 agents --flush --workspace {workspace}")
+
+    async def prepare(self):
+        """
+        Flush the agents left in the workspace by previous runs or attempts
+        and create the task's agent, unless it already exists.
+
+        Returns:
+            tuple: stdout, stderr, and return code of the init command, or
+            None if the agent already exists.
+        """
+        if self.initialized:
+            return None
+        await self._flush()
+        stdout, stderr, returncode = await self._run_lifecycle_command(
+            f"@2501 init --config {self.agent_config}"
+        )
+        self.initialized = returncode == 0
+        return stdout, stderr, returncode
+
+    async def run_prompt(self, input_command, stdout, stderr, watcher=None, timer=None):
+        """
+        Run a prompt with the task's agent.
+
+        Args:
+            input_command (str): The prompt.
+            stdout (OutputBuffer): Receives the agent's stdout.
+            stderr (OutputBuffer): Receives the agent's stderr.
+            watcher (EarlyVerdictWatcher, optional): Stops the agent once it has a verdict.
+            timer (PhaseTimer, optional): Times the agent init and run of the attempt.
+
+        Returns:
+            int: Return code of the agent command.
+        """
+        timer = timer or PhaseTimer()
+        with timer.phase(AGENT_INIT):
+            prepared = await self.prepare()
+        if prepared is not None and prepared[2] != 0:
+            init_stdout, init_stderr, returncode = prepared
+            stdout.write(init_stdout.encode("utf-8"))
+            stderr.write(init_stderr.encode("utf-8"))
+            stdout.close()
+            stderr.close()
+            return returncode
+        command_to_run = f'cd {self.workspace_dir} && TFZO_DISABLE_SPINNER=true @2501 "{input_command}"'
+        logging.info(f"Executing command: {command_to_run}")
+        self.cli_starts += 1
+        self.prompts += 1
+        with timer.phase(AGENT):
+            return await run_command_streaming(command_to_run, stdout, stderr, watcher)
+
+    async def close(self):
+        """
+        Flush the task's agents once the task is done, if any command ran.
+        """
+        if self.cli_starts:
+            await self._flush()
+        self.initialized = False
+
+    def startup_saved_ms(self):
+        """
+        Estimate the CLI startup time saved compared to three commands per
+        attempt. The flush and init commands do little besides starting the
+        CLI, so their average duration is the cost of a start.
+
+        Returns:
+            int: The estimated time saved in milliseconds.
+        """
+        lifecycle_starts = self.cli_starts - self.prompts
+        if not lifecycle_starts:
+            return 0
+        saved_starts = CLI_STARTS_PER_ATTEMPT * self.prompts - self.cli_starts
+        return max(0, saved_starts) * self.lifecycle_ms // lifecycle_starts
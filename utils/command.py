@@ -1,9 +1,15 @@
+import asyncio
 import os
 import subprocess
 import sys
 import signal
+import time
+
+from utils.tracing import record_span, span
 
 COMMAND_TIMEOUT = 600  # 10 minutes
+STREAM_CHUNK_SIZE = 64 * 1024
+KILL_GRACE_SECONDS = 5
 
 # Global variable to hold the subprocess
 subprocess_instance = None
@@ -37,16 +43,17 @@ def run_command(command, input_data=None):
     env["PYTHONIOENCODING"] = "utf-8"  # Ensure Python uses UTF-8 encoding
     global subprocess_instance
     try:
-        subprocess_instance = subprocess.Popen(
-            command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE,
-            text=True,
-            env=env,
-        )
-        stdout, stderr = subprocess_instance.communicate(input=input_data)
+        with span("command", command=command):
+            subprocess_instance = subprocess.Popen(
+                command,
+                shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                stdin=subprocess.PIPE,
+                text=True,
+                env=env,
+            )
+            stdout, stderr = subprocess_instance.communicate(input=input_data)
         return stdout.strip(), stderr.strip(), subprocess_instance.returncode
     except KeyboardInterrupt:
         print("Interrupted! Terminating subprocess...")
@@ -56,3 +63,120 @@ def run_command(command, input_data=None):
         sys.exit(0)
     finally:
         subprocess_instance = None
+
+
+async def run_command_async(command, input_data=None, input_path=None):
+    """
+    Run a shell command without blocking the event loop and return the output.
+
+    Args:
+        command (str): The command to run.
+        input_data (str, optional): Input data to pass to the command as stdin.
+        input_path (str, optional): File passed to the command as stdin, instead of input_data.
+
+    Returns:
+        tuple: stdout, stderr, and return code of the command.
+    """
+    env = os.environ.copy()
+    env["TERM"] = "xterm"  # Set the TERM environment variable
+    env["PYTHONIOENCODING"] = "utf-8"  # Ensure Python uses UTF-8 encoding
+    start_time = time.monotonic()
+    stdin_file = open(input_path, "rb") if input_path else None
+    try:
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=stdin_file or asyncio.subprocess.PIPE,
+            env=env,
+        )
+    finally:
+        if stdin_file:
+            stdin_file.close()  # The child has its own copy
+    try:
+        stdout, stderr = await process.communicate(
+            input=input_data.encode("utf-8") if input_data is not None else None
+        )
+    except asyncio.CancelledError:
+        # The run is being torn down (CTRL+C or --fail-fast), don't leave orphans
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        raise
+    record_span("command", start_time, command=command, returncode=process.returncode)
+    return (
+        stdout.decode("utf-8", errors="replace").strip(),
+        stderr.decode("utf-8", errors="replace").strip(),
+        process.returncode,
+    )
+
+
+async def _kill_process_group(process):
+    """Terminate a process started in its own session, and everything it started."""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
+
+
+async def run_command_streaming(command, stdout, stderr, watcher=None):
+    """
+    Run a shell command without blocking the event loop, streaming its
+    output into buffers instead of holding it in memory.
+
+    Both pipes are read concurrently, so a command filling one of them while
+    the other is being read can't deadlock.
+
+    Args:
+        command (str): The command to run.
+        stdout (OutputBuffer): Receives the command's stdout.
+        stderr (OutputBuffer): Receives the command's stderr.
+        watcher (EarlyVerdictWatcher, optional): Sees stdout as it arrives;
+            once it has a verdict, the command and its children are killed.
+
+    Returns:
+        int: Return code of the command.
+    """
+    env = os.environ.copy()
+    env["TERM"] = "xterm"  # Set the TERM environment variable
+    env["PYTHONIOENCODING"] = "utf-8"  # Ensure Python uses UTF-8 encoding
+    start_time = time.monotonic()
+    process = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        stdin=asyncio.subprocess.DEVNULL,
+        env=env,
+        # Own process group, so the agent's children can be killed with it
+        start_new_session=True,
+    )
+
+    async def pump(stream, buffer, watcher=None):
+        while True:
+            chunk = await stream.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer.write(chunk)
+            if watcher is not None and watcher.verdict is None and watcher.feed(chunk):
+                await _kill_process_group(process)
+
+    try:
+        await asyncio.gather(
+            pump(process.stdout, stdout, watcher),
+            pump(process.stderr, stderr),
+            process.wait(),
+        )
+    except asyncio.CancelledError:
+        # The run is being torn down (CTRL+C or --fail-fast), don't leave orphans
+        if process.returncode is None:
+            await _kill_process_group(process)
+        raise
+    finally:
+        stdout.close()
+        stderr.close()
+    record_span("command", start_time, command=command, returncode=process.returncode)
+    return process.returncode
@@ -0,0 +1,145 @@
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from utils.file import file_sha256
+
+DATASET_CACHE_DIR = os.path.join(".cache", "datasets")
+
+# Extractions not used for this long are pruned when a run starts
+DATASET_CACHE_MAX_AGE_DAYS = 7
+
+# Archive metadata added by macOS, never needed by the tasks
+IGNORED_ENTRIES = {"__MACOSX"}
+
+
+def get_cached_dataset(zip_path, cache_dir=DATASET_CACHE_DIR):
+    """
+    Get the extracted content of a dataset zip, extracting it only the first time.
+
+    Extractions are keyed by the sha256 of the zip, so an updated archive is
+    extracted again. They are done in a temporary directory and renamed into
+    place, so concurrent workers never see a partial tree.
+
+    Args:
+        zip_path (str): Path to the dataset zip.
+        cache_dir (str): Directory holding the extracted datasets.
+
+    Returns:
+        str: Directory holding the extracted content of the zip.
+    """
+    cached_dir = os.path.join(cache_dir, file_sha256(zip_path))
+    if os.path.isdir(cached_dir):
+        try:
+            # Last use, read by prune_dataset_cache
+            os.utime(cached_dir)
+        except OSError:
+            pass  # Pruned in the meantime
+        return cached_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".extract-")
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            zip_ref.extractall(tmp_dir)
+        os.rename(tmp_dir, cached_dir)
+        logging.info(f"Extracted {zip_path} into the dataset cache")
+    except OSError:
+        # Another worker extracted the same zip first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(cached_dir):
+            raise
+    return cached_dir
+
+
+def prune_dataset_cache(
+    trash_dir, cache_dir=DATASET_CACHE_DIR, max_age_days=DATASET_CACHE_MAX_AGE_DAYS
+):
+    """
+    Move the extractions not used for max_age_days into the trash directory,
+    emptied in the background by remove_previous_folders. This drops the
+    extractions of outdated zips, which are never used again, and the
+    leftovers of interrupted extractions.
+
+    Args:
+        trash_dir (str): The trash directory, see remove_previous_folders.
+        cache_dir (str): Directory holding the extracted datasets.
+        max_age_days (float): Days without use after which extractions are pruned.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    os.makedirs(trash_dir, exist_ok=True)
+    oldest = time.time() - max_age_days * 24 * 3600
+    pruned = 0
+    for item in os.listdir(cache_dir):
+        item_path = os.path.join(cache_dir, item)
+        try:
+            if os.stat(item_path).st_mtime >= oldest:
+                continue
+            os.rename(item_path, os.path.join(trash_dir, f"dataset-cache-{item}"))
+        except OSError:
+            shutil.rmtree(item_path, ignore_errors=True)
+        pruned += 1
+    if pruned:
+        logging.info(
+            f"Pruned {pruned} dataset extractions unused for {max_age_days} days"
+        )
+
+
+def _clone_tree(source_dir, dest_dir):
+    """
+    Copy a directory tree using copy-on-write clones when the filesystem
+    supports them (reflinks on Linux, clonefile on macOS), regular copies otherwise.
+    Hardlinks are not an option: the agent edits files in place, which would
+    write through to the cache.
+    """
+    if sys.platform.startswith("linux"):
+        command = ["cp", "-a", "--reflink=auto", source_dir, dest_dir]
+    elif sys.platform == "darwin":
+        command = ["cp", "-c", "-R", "-p", source_dir, dest_dir]
+    else:
+        command = None
+
+    if command:
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode == 0:
+            return
+        logging.warning(f"Falling back to a regular copy: {result.stderr.strip()}")
+        shutil.rmtree(dest_dir, ignore_errors=True)
+    shutil.copytree(source_dir, dest_dir, symlinks=True)
+
+
+def materialize_dataset(zip_path, dest_dir):
+    """
+    Create a clean workspace for a task from its dataset zip, replacing any
+    previous content of the workspace.
+
+    Args:
+        zip_path (str, optional): Path to the dataset zip, None for an empty workspace.
+        dest_dir (str): The task workspace, e.g. datasets/honest_1.
+    """
+    start_time = time.monotonic()
+    if os.path.lexists(dest_dir):
+        shutil.rmtree(dest_dir)
+
+    if zip_path is None:
+        os.makedirs(dest_dir)
+        return
+
+    cached_dir = get_cached_dataset(zip_path)
+    # Zips contain the workspace folder itself (honest_1.zip holds honest_1/)
+    source_dir = os.path.join(cached_dir, os.path.basename(dest_dir))
+    if not os.path.isdir(source_dir):
+        entries = [e for e in os.listdir(cached_dir) if e not in IGNORED_ENTRIES]
+        source_dir = cached_dir
+        if len(entries) == 1 and os.path.isdir(os.path.join(cached_dir, entries[0])):
+            source_dir = os.path.join(cached_dir, entries[0])
+    _clone_tree(source_dir, dest_dir)
+    logging.info(
+        f"Materialized {zip_path} into {dest_dir} in {int((time.monotonic() - start_time) * 1000)}ms"
+    )
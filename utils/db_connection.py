@@ -1,13 +1,88 @@
 import json
 import os
 import sys
+import threading
+import time
 
-import psycopg2
-from dotenv import load_dotenv
+POOL_MAX_CONNECTIONS = 4
+POOL_IDLE_CONNECTIONS = 2
+
+# Process-wide pool, recreated after a fork since connections can't be shared
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_stats = {
+    "handshakes": 0,
+    "handshake_ms_total": 0.0,
+    "queries": 0,
+    "query_ms_total": 0.0,
+    "query_ms_max": 0.0,
+    "reconnects": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _create_pool(database_url):
+    """
+    Create a lazy connection pool recording every new connection (TCP/TLS handshake).
+
+    psycopg2 opens `minconn` connections upfront and closes returned connections
+    beyond `minconn`, so the pool starts empty and only afterwards keeps up to
+    POOL_IDLE_CONNECTIONS connections around for reuse.
+    """
+    # psycopg2 is only imported once the database is actually used
+    from psycopg2.pool import ThreadedConnectionPool
+
+    class CountingConnectionPool(ThreadedConnectionPool):
+        def _connect(self, key=None):
+            start = time.monotonic()
+            connection = super()._connect(key)
+            with _stats_lock:
+                _stats["handshakes"] += 1
+                _stats["handshake_ms_total"] += (time.monotonic() - start) * 1000
+            return connection
+
+    pool = CountingConnectionPool(0, POOL_MAX_CONNECTIONS, database_url)
+    pool.minconn = POOL_IDLE_CONNECTIONS
+    return pool
+
+
+def _get_pool(database_url):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = _create_pool(database_url)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _record_query(duration_ms):
+    with _stats_lock:
+        _stats["queries"] += 1
+        _stats["query_ms_total"] += duration_ms
+        _stats["query_ms_max"] = max(_stats["query_ms_max"], duration_ms)
+
+
+def get_db_stats():
+    """
+    Get the database usage statistics of the current process.
+
+    Returns:
+        dict: Handshake and query counters with their latencies in milliseconds.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["query_ms_avg"] = (
+        stats["query_ms_total"] / stats["queries"] if stats["queries"] else 0.0
+    )
+    return stats
 
 
 class DBConnector:
     def __init__(self, env_path=".env"):
+        from dotenv import load_dotenv
+
         # Load environment variables from the .env file
         load_dotenv(env_path)
 
@@ -16,31 +91,66 @@ class DBConnector:
         if not self.database_url:
             raise ValueError("Database 'DIRECT_URL' not found in environment variables")
 
-        # Establish a connection to the PostgreSQL database during initialization
+        # Connections are taken from the process-wide pool on first use
         self.connection = None
-        self.check()
 
     def check(self):
         try:
-            self.connection = psycopg2.connect(self.database_url)
-            self.connection.close()
-            self.connection = None
+            self._run_query(lambda cursor: cursor.execute("SELECT 1"))
         except Exception as e:
             print(f"Error connecting to PostgreSQL DB: {e}")
             sys.exit(1)
+        finally:
+            self.close_connection()
 
     def connect(self):
         try:
-            self.connection = psycopg2.connect(self.database_url)
-            print("Connection to PostgreSQL DB successful")
+            self.connection = _get_pool(self.database_url).getconn()
+            if self.connection.closed:
+                # Closed while sitting in the pool, get a fresh one
+                self._discard_connection()
+                self.connection = _get_pool(self.database_url).getconn()
         except Exception as e:
             print(f"Error connecting to PostgreSQL DB: {e}")
             sys.exit(1)
 
     def close_connection(self):
         if self.connection:
-            self.connection.close()
-            print("PostgreSQL connection closed")
+            # Give the connection back to the pool for the next user
+            _get_pool(self.database_url).putconn(self.connection)
+            self.connection = None
+
+    def _discard_connection(self):
+        if self.connection:
+            _get_pool(self.database_url).putconn(self.connection, close=True)
+            self.connection = None
+
+    def _run_query(self, run):
+        """
+        Run `run(cursor)` in a transaction, reconnecting once if the connection went stale.
+
+        :param run: Callable receiving a cursor
+        :return: Whatever `run` returns
+        """
+        import psycopg2
+
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connect()
+            start = time.monotonic()
+            try:
+                result = run(self.connection.cursor())
+                self.connection.commit()
+                return result
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # Server restart or idle timeout: drop the connection and retry once
+                self._discard_connection()
+                with _stats_lock:
+                    _stats["reconnects"] += 1
+                if attempt == 2:
+                    raise
+            finally:
+                _record_query((time.monotonic() - start) * 1000)
 
     def store_benchmark_result(self, result_data):
         """
@@ -49,40 +159,80 @@ class DBConnector:
         :param result_data: Dictionary containing benchmark result fields
         :return: Number of rows inserted or None if failed
         """
-        try:
-            cursor = self.connection.cursor()
-            query = """
-            INSERT INTO "Benchmarks" (task_id, task_name, benchmark_id, input, labels, passed, duration_ms, pre_process_model, model_pair, accuracy, run_at, benchmark_file, error_message, test)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            # Serialize JSON fields
-            test_json = json.dumps(result_data["test"])
-            labels_json = json.dumps(result_data["labels"])
-            model_pair_json = json.dumps(result_data["model_pair"])
-
-            arguments = (
-                result_data["task_id"],
-                result_data["task_name"],
-                result_data["benchmark_id"],
-                result_data["input"],
-                labels_json,
-                result_data["passed"],
-                result_data["duration_ms"],
-                result_data["pre_process_model"],
-                model_pair_json,
-                result_data["accuracy"],
-                result_data["run_at"],
-                result_data["benchmark_file"],
-                result_data["error_message"],
-                test_json,
-            )
-
-            cursor.execute(query, arguments)
-
-            self.connection.commit()
+        def insert(cursor):
+            cursor.execute(INSERT_BENCHMARK_QUERY, benchmark_result_arguments(result_data))
             return cursor.rowcount
+
+        try:
+            return self._run_query(insert)
         except Exception as e:
             print(f"Error storing benchmark result: {e}")
 
-            self.connection.rollback()
+            if self.connection:
+                self.connection.rollback()
             return None
+
+    def store_benchmark_results(self, rows):
+        """
+        Store several benchmark results in a single statement and transaction.
+
+        :param rows: List of argument tuples built with benchmark_result_arguments
+        :return: Number of rows inserted or None if failed
+        """
+        from psycopg2.extras import execute_values
+
+        def insert(cursor):
+            execute_values(cursor, INSERT_BENCHMARK_BATCH_QUERY, rows)
+            return len(rows)
+
+        try:
+            return self._run_query(insert)
+        except Exception as e:
+            print(f"Error storing benchmark results: {e}")
+
+            if self.connection:
+                self.connection.rollback()
+            return None
+
+
+INSERT_BENCHMARK_COLUMNS = "task_id, task_name, benchmark_id, input, labels, passed, duration_ms, pre_process_model, model_pair, accuracy, run_at, benchmark_file, error_message, test"
+
+INSERT_BENCHMARK_QUERY = f"""
+INSERT INTO "Benchmarks" ({INSERT_BENCHMARK_COLUMNS})
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_BENCHMARK_BATCH_QUERY = f"""
+INSERT INTO "Benchmarks" ({INSERT_BENCHMARK_COLUMNS})
+VALUES %s
+"""
+
+
+def benchmark_result_arguments(result_data):
+    """
+    Build the INSERT arguments for a benchmark result, serializing the JSON fields.
+
+    :param result_data: Dictionary containing benchmark result fields
+    :return: Tuple of arguments matching INSERT_BENCHMARK_COLUMNS
+    """
+    # Serialize JSON fields
+    test_json = json.dumps(result_data["test"])
+    labels_json = json.dumps(result_data["labels"])
+    model_pair_json = json.dumps(result_data["model_pair"])
+
+    return (
+        result_data["task_id"],
+        result_data["task_name"],
+        result_data["benchmark_id"],
+        result_data["input"],
+        labels_json,
+        result_data["passed"],
+        result_data["duration_ms"],
+        result_data["pre_process_model"],
+        model_pair_json,
+        result_data["accuracy"],
+        result_data["run_at"],
+        result_data["benchmark_file"],
+        result_data["error_message"],
+        test_json,
+    )
@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+import time
+
+from utils.db_connection import DBConnector, benchmark_result_arguments
+from utils.profiling import profile_section
+from utils.tracing import span
+
+# Markers asking the writer thread to flush whatever it has buffered, and to stop
+_FLUSH = object()
+_STOP = object()
+
+
+class ResultWriter:
+    """
+    Store benchmark results from a background thread, in batches.
+
+    Rows are serialized when submitted, then buffered until either
+    `batch_size` rows are pending or `flush_interval` seconds have passed
+    since the first pending row, and written with a single INSERT.
+    The queue is bounded so a stalled database eventually applies
+    backpressure instead of growing memory without limit.
+
+    The thread is started by the first submitted result, not when the
+    writer is created: the report is built before the worker pool is
+    forked, and forking a process that runs threads can deadlock the child.
+    """
+
+    def __init__(self, batch_size=20, flush_interval=2.0, max_queue_size=1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="db-result-writer", daemon=True
+                )
+                self.thread.start()
+
+    def submit(self, result_data):
+        """
+        Queue a benchmark result for storage.
+
+        Args:
+            result_data (dict): Benchmark result fields, see DBConnector.store_benchmark_result
+        """
+        self._ensure_started()
+        # Serialize now: `test` keeps changing while more results come in
+        self.queue.put(benchmark_result_arguments(result_data))
+
+    def drain(self):
+        """
+        Block until every submitted result has been written (or failed to be).
+        """
+        if self.thread is None:
+            return  # Nothing submitted
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def close(self):
+        """
+        Write every submitted result and stop the writer thread.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # Flush interval elapsed
+
+            if item is not None and item is not _FLUSH and item is not _STOP:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # The thread must survive, or drain() would wait forever
+                logging.error(f"Failed to store {len(batch)} benchmark results: {e}")
+            for _ in batch:
+                self.queue.task_done()
+            batch = []
+            if item is _FLUSH or item is _STOP:
+                self.queue.task_done()
+            if item is _STOP:
+                return
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        db_connector = None
+        try:
+            with profile_section("db-result-writer"), span("db_write", rows=len(batch)):
+                db_connector = DBConnector()
+                db_connector.store_benchmark_results(batch)
+        except (Exception, SystemExit) as e:
+            # DBConnector exits on connection errors, which must not kill the writer
+            logging.error(f"Failed to store {len(batch)} benchmark results: {e}")
+        finally:
+            if db_connector is not None:
+                db_connector.close_connection()
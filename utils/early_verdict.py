@@ -0,0 +1,78 @@
+"""
+Early verdicts from the agent output, while the agent still runs.
+
+Some validators know their verdict before the agent is done: once the
+transcript shows `Command executed: vim`, test_forbidden_keywords fails
+whatever comes next. Such validators define a StreamValidator class:
+
+    class StreamValidator:
+        def __init__(self, args): ...   # The validator's command line arguments
+        def feed(self, line): ...       # Next output line, returns "PASS", "FAIL" or None
+
+and are listed in scripts.STREAM_VALIDATORS. When one returns a verdict,
+the agent is killed and the validator itself is not run.
+"""
+
+import codecs
+import importlib
+import logging
+import os
+
+from scripts import STREAM_VALIDATORS
+from utils.validator_service import parse_validator_command
+
+# Longer lines are cut to their end before being fed to the validator
+MAX_LINE_CHARS = 64 * 1024
+
+
+def load_stream_validator(test_command):
+    """
+    Get the stream validator of a test_command, if its validator has one.
+
+    Args:
+        test_command (str): The task's test_command.
+
+    Returns:
+        EarlyVerdictWatcher: Watcher to feed the agent output to, or None.
+    """
+    parsed = parse_validator_command(test_command or "")
+    if parsed is None:
+        return None
+    script_path, args = parsed
+    name = os.path.splitext(os.path.basename(script_path))[0]
+    if name not in STREAM_VALIDATORS:
+        return None
+    module = importlib.import_module(f"scripts.{name}")
+    return EarlyVerdictWatcher(module.StreamValidator(args))
+
+
+class EarlyVerdictWatcher:
+    """
+    Splits the agent output into lines for a stream validator and keeps its verdict.
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.partial = ""
+        self.verdict = None
+
+    def feed(self, chunk):
+        """
+        Args:
+            chunk (bytes): Next chunk of the agent's stdout.
+
+        Returns:
+            str: "PASS" or "FAIL" once the verdict is known, None before.
+        """
+        if self.verdict:
+            return self.verdict
+        lines = (self.partial + self.decoder.decode(chunk)).split("\n")
+        self.partial = lines.pop()[-MAX_LINE_CHARS:]
+        for line in lines:
+            verdict = self.validator.feed(line[-MAX_LINE_CHARS:] + "\n")
+            if verdict:
+                self.verdict = verdict.strip().upper()
+                logging.info(f"Early verdict: {self.verdict}, stopping the agent")
+                break
+        return self.verdict
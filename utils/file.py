@@ -1,20 +1,75 @@
+import hashlib
 import json
+import logging
+import multiprocessing
 import os
 import shutil
+import tempfile
+import time
+import uuid
+
+from utils.preflight import referenced_scripts
+
+
+TRASH_DIR_NAME = ".trash"
 
 
 def remove_previous_folders(files_dir):
     """
     Remove all previous folders in the files directory.
 
+    Folders are renamed into a trash directory right away, which frees their
+    names for the new run, and deleted by a background process.
+
     Args:
         files_dir (str): The directory containing the files.
+
+    Returns:
+        multiprocessing.Process: The process emptying the trash.
     """
+    trash_dir = os.path.join(files_dir, TRASH_DIR_NAME)
+    os.makedirs(trash_dir, exist_ok=True)
     for item in os.listdir(files_dir):
         item_path = os.path.join(files_dir, item)
-        if os.path.isdir(item_path):
+        if item == TRASH_DIR_NAME or not os.path.isdir(item_path):
+            continue
+        try:
+            os.rename(item_path, os.path.join(trash_dir, f"{item}-{uuid.uuid4().hex}"))
+        except OSError:
             shutil.rmtree(item_path)
 
+    cleanup = multiprocessing.Process(
+        target=empty_trash, args=(trash_dir,), name="datasets-cleanup"
+    )
+    cleanup.start()
+    return cleanup
+
+
+def empty_trash(trash_dir):
+    """
+    Delete everything in the trash directory and log how long it took and how much it freed.
+
+    Args:
+        trash_dir (str): The trash directory.
+    """
+    start_time = time.monotonic()
+    freed_bytes = 0
+    folders = os.listdir(trash_dir)
+    for item in folders:
+        item_path = os.path.join(trash_dir, item)
+        for root, dirs, files in os.walk(item_path):
+            for name in files + dirs:
+                try:
+                    freed_bytes += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        shutil.rmtree(item_path, ignore_errors=True)
+    if folders:
+        logging.info(
+            f"Removed {len(folders)} previous folders ({freed_bytes / (1024 * 1024):.1f} MB) "
+            f"in {time.monotonic() - start_time:.1f}s"
+        )
+
 
 def extract_tests_from_jsonl(jsonl_path):
     tests = []
@@ -28,10 +83,68 @@ def extract_tests_from_jsonl(jsonl_path):
             tests.append(test)
     return tests
 
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Compute the sha256 hex digest of a file, reading it in chunks.
+
+    Args:
+        path (str): Path to the file.
+        chunk_size (int): Number of bytes read at once.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def task_fingerprint(task, files_dir):
+    """
+    Hash a task definition together with its dataset zip and the validator
+    scripts its test_command runs, if any, so that editing any of them
+    yields a different fingerprint.
+
+    Args:
+        task (dict): The task dictionary.
+        files_dir (str): The directory containing the dataset zips.
+    """
+    digest = hashlib.sha256(json.dumps(task, sort_keys=True).encode("utf-8"))
+    zip_path = os.path.join(files_dir, f"{task['id']}.zip")
+    if os.path.exists(zip_path):
+        digest.update(file_sha256(zip_path).encode("utf-8"))
+    for path in referenced_scripts(task.get("test_command") or ""):
+        if os.path.isfile(path):
+            digest.update(file_sha256(path).encode("utf-8"))
+    return digest.hexdigest()
+
+
 def load_config(config_file):
     try:
         with open(config_file, 'r') as file:
             return json.load(file)
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Error loading configuration: {e}")
-        return {"model_pair": [], "available_models": []}
\ No newline at end of file
+        return {"model_pair": [], "available_models": []}
+
+
+def write_json_atomic(path, data):
+    """
+    Write data as JSON to a file, atomically replacing any previous version.
+
+    Args:
+        path (str): Destination file path.
+        data (dict): JSON serializable data.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
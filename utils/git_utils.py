@@ -1,5 +1,5 @@
+import os
 import subprocess
-import git
 
 def get_git_branch():
     """Get the current git branch name."""
@@ -27,9 +27,45 @@ def get_local_changes():
         None: If unable to determine the state
     """
     try:
+        import git  # GitPython is slow to import, only load it when needed
+
         repo = git.Repo(search_parent_directories=True)
         # Count modified tracked files (excluding untracked files)
         return len(repo.index.diff(None))
     except Exception:
         # Return None if we can't determine the state
         return None
+
+
+def get_git_head_key():
+    """
+    Identify the current git HEAD without spawning git, by reading the .git files.
+    Returns:
+        str: The branch reference and commit it points to
+        None: If not in a git repository
+    """
+    directory = os.path.abspath(os.getcwd())
+    while not os.path.isdir(os.path.join(directory, ".git")):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+    git_dir = os.path.join(directory, ".git")
+
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r") as file:
+            head = file.read().strip()
+        if not head.startswith("ref: "):
+            return head  # Detached HEAD
+        ref = head[len("ref: ") :]
+        ref_path = os.path.join(git_dir, ref)
+        if os.path.exists(ref_path):
+            with open(ref_path, "r") as file:
+                return f"{ref}@{file.read().strip()}"
+        with open(os.path.join(git_dir, "packed-refs"), "r") as file:
+            for line in file:
+                if line.rstrip().endswith(f" {ref}"):
+                    return f"{ref}@{line.split()[0]}"
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import time
+
+
+class ResultJournal:
+    """
+    Append-only JSONL journal of a benchmark run.
+
+    Every record is written and flushed as soon as it is appended, so it
+    survives the harness being killed. fsync is batched: it runs on an
+    append once `fsync_every` records are pending or `fsync_interval`
+    seconds have passed since the last fsync, and on sync()/close(). There
+    is no timer: the last records of a quiet run stay unsynced until the
+    next append or sync().
+    """
+
+    def __init__(self, path, fsync_every=16, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def append(self, record):
+        """
+        Append a record to the journal.
+
+        Args:
+            record (dict): JSON serializable record, with a "type" key.
+        """
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.pending += 1
+        if (
+            self.pending >= self.fsync_every
+            or time.monotonic() - self.last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def sync(self):
+        """Force the appended records to disk."""
+        if self.file.closed:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+def load_journal(path):
+    """
+    Replay a journal into report data: the run header fields plus "tests",
+    each test holding its results in the order they were journaled.
+
+    A truncated last line (the harness died mid-write) is ignored.
+
+    Args:
+        path (str): Path to the journal file.
+
+    Returns:
+        dict: The report data rebuilt from the journal.
+    """
+    data = {"tests": []}
+    tests_by_name = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping unreadable journal line {line_number} in {path}")
+                continue
+
+            if record["type"] == "run":
+                header = dict(record)
+                header.pop("type")
+                data.update(header)
+            elif record["type"] == "test":
+                test = record["test"]
+                if test["name"] not in tests_by_name:
+                    test = dict(test, results=[])
+                    tests_by_name[test["name"]] = test
+                    data["tests"].append(test)
+            elif record["type"] == "result":
+                tests_by_name[record["test"]]["results"].append(record["result"])
+    return data
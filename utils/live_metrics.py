@@ -0,0 +1,277 @@
+"""
+Live OpenMetrics endpoint of a benchmark run.
+
+The parent process keeps counters of the run, fed by the result loop and by
+heartbeats of the pool workers, and serves them over HTTP for Prometheus
+compatible dashboards:
+
+    python evaluate.py --metrics-port 9100
+    curl http://127.0.0.1:9100/metrics
+
+Workers put small (pid, event, task_id, time) tuples on a queue passed in
+the Pool initializer: "start" and "finish" around each task, and "alive"
+every few seconds from a background thread, so a stuck worker shows up as
+a task running for too long, and a dead or wedged one as a stale heartbeat.
+"""
+
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HEARTBEAT_SECONDS = 5.0
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Set in the processes that report heartbeats, by init_worker
+_heartbeats = None
+
+
+def init_worker(heartbeats, interval=HEARTBEAT_SECONDS):
+    """
+    Pool initializer: report heartbeats of this process on the given queue.
+
+    Args:
+        heartbeats (multiprocessing.Queue): Queue read by RunMetrics.serve in the parent.
+        interval (float): Seconds between two "alive" heartbeats.
+    """
+    global _heartbeats
+    _heartbeats = heartbeats
+
+    def beat():
+        while True:
+            heartbeat("alive")
+            time.sleep(interval)
+
+    threading.Thread(target=beat, name="heartbeat", daemon=True).start()
+
+
+def heartbeat(event, task_id=None):
+    """
+    Report what this process is doing, if the run has a metrics endpoint.
+
+    Args:
+        event (str): "start" or "finish" of a task, or "alive".
+        task_id (str, optional): The task started or finished.
+    """
+    if _heartbeats is None:
+        return
+    try:
+        _heartbeats.put_nowait((os.getpid(), event, task_id, time.time()))
+    except Exception as e:
+        # Metrics must never fail a task
+        logging.debug(f"Heartbeat dropped: {e}")
+
+
+class Histogram:
+    """Cumulative histogram with the LATENCY_BUCKETS bounds."""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class RunMetrics:
+    """
+    State of a benchmark run, updated from the result loop and the heartbeat
+    thread, read by the HTTP handler threads.
+    """
+
+    def __init__(self, total_tasks):
+        """
+        Args:
+            total_tasks (int): Number of tasks of the run, to derive the queue depth.
+        """
+        self.lock = threading.Lock()
+        self.total_tasks = total_tasks
+        self.started = set()
+        self.finished = set()
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.task_durations = Histogram()
+        self.phase_durations = {}
+        # pid -> {"last_seen": time, "tasks": {task_id: start time}}, a pool
+        # worker runs one task at a time, the asyncio engine all of them
+        self.workers = {}
+        self.server = None
+        self.heartbeats = None
+        self.reader = None
+
+    def record_result(self, result_entry):
+        """
+        Count a task result, as handed over to the benchmark report.
+
+        Args:
+            result_entry (dict): The result entry.
+        """
+        metrics = result_entry.get("metrics") or {}
+        with self.lock:
+            self.finished.add(result_entry["task_id"])
+            if result_entry["passed"]:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.retries += result_entry.get("retries") or 0
+            self.task_durations.observe((metrics.get("duration_ms") or 0) / 1000)
+            for name, duration_ms in (metrics.get("phases") or {}).items():
+                self.phase_durations.setdefault(name, Histogram()).observe(
+                    duration_ms / 1000
+                )
+
+    def record_heartbeat(self, pid, event, task_id, timestamp):
+        """
+        Update the state of a worker from one of its heartbeats.
+        """
+        with self.lock:
+            worker = self.workers.setdefault(pid, {"last_seen": timestamp, "tasks": {}})
+            worker["last_seen"] = max(worker["last_seen"], timestamp)
+            if event == "start":
+                self.started.add(task_id)
+                worker["tasks"][task_id] = timestamp
+            elif event == "finish":
+                worker["tasks"].pop(task_id, None)
+
+    def serve(self, port, heartbeats, host="127.0.0.1"):
+        """
+        Serve the metrics over HTTP and read the heartbeats, from daemon
+        threads of the current process, until close() is called.
+
+        Args:
+            port (int): Port to listen on.
+            heartbeats (multiprocessing.Queue): The queue given to init_worker.
+            host (str): Interface to listen on, local only by default.
+        """
+        self.heartbeats = heartbeats
+        self.reader = threading.Thread(
+            target=self._read_heartbeats, name="heartbeat-reader", daemon=True
+        )
+        self.reader.start()
+        self.server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.metrics = self
+        threading.Thread(
+            target=self.server.serve_forever, name="metrics", daemon=True
+        ).start()
+        logging.info(f"Serving live metrics on http://{host}:{port}/metrics")
+
+    def _read_heartbeats(self):
+        for message in iter(self.heartbeats.get, None):
+            self.record_heartbeat(*message)
+
+    def close(self):
+        """Stop serving the metrics and reading the heartbeats."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.reader is not None:
+            self.heartbeats.put(None)
+            self.reader.join()
+
+    def render(self):
+        """
+        Get the metrics in the OpenMetrics text format.
+
+        Returns:
+            str: The exposition, ending with "# EOF".
+        """
+        now = time.time()
+        with self.lock:
+            # Results and heartbeats arrive on different channels, in any order
+            in_flight = len(self.started - self.finished)
+            queued = max(0, self.total_tasks - len(self.started | self.finished))
+            lines = [
+                "# TYPE benchmark_tasks gauge",
+                "# HELP benchmark_tasks Tasks of the run.",
+                f"benchmark_tasks {self.total_tasks}",
+                "# TYPE benchmark_tasks_queued gauge",
+                "# HELP benchmark_tasks_queued Tasks not started yet.",
+                f"benchmark_tasks_queued {queued}",
+                "# TYPE benchmark_tasks_in_flight gauge",
+                "# HELP benchmark_tasks_in_flight Tasks running.",
+                f"benchmark_tasks_in_flight {in_flight}",
+                "# TYPE benchmark_tasks_completed counter",
+                "# HELP benchmark_tasks_completed Tasks passed.",
+                f"benchmark_tasks_completed_total {self.completed}",
+                "# TYPE benchmark_tasks_failed counter",
+                "# HELP benchmark_tasks_failed Tasks failed after their retries.",
+                f"benchmark_tasks_failed_total {self.failed}",
+                "# TYPE benchmark_task_retries counter",
+                "# HELP benchmark_task_retries Attempts retried.",
+                f"benchmark_task_retries_total {self.retries}",
+            ]
+            lines += _histogram_lines(
+                "benchmark_task_duration_seconds",
+                "Duration of the tasks.",
+                [("", self.task_durations)],
+            )
+            lines += _histogram_lines(
+                "benchmark_phase_duration_seconds",
+                "Duration of the task phases, summed over their attempts.",
+                [
+                    (f'phase="{name}"', histogram)
+                    for name, histogram in sorted(self.phase_durations.items())
+                ],
+            )
+            lines += [
+                "# TYPE benchmark_worker_heartbeat_age_seconds gauge",
+                "# HELP benchmark_worker_heartbeat_age_seconds Time since the last heartbeat of the worker.",
+            ]
+            lines += [
+                f'benchmark_worker_heartbeat_age_seconds{{worker="{pid}"}} '
+                f"{now - worker['last_seen']:.3f}"
+                for pid, worker in sorted(self.workers.items())
+            ]
+            lines += [
+                "# TYPE benchmark_worker_task_seconds gauge",
+                "# HELP benchmark_worker_task_seconds Time the worker spent on its oldest running task, 0 when idle.",
+            ]
+            lines += [
+                f'benchmark_worker_task_seconds{{worker="{pid}"}} '
+                f"{now - min(worker['tasks'].values()) if worker['tasks'] else 0:.3f}"
+                for pid, worker in sorted(self.workers.items())
+            ]
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name, help_text, histograms):
+    lines = [f"# TYPE {name} histogram", f"# HELP {name} {help_text}"]
+    for labels, histogram in histograms:
+        separator = "," if labels else ""
+        for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {histogram.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+        lines.append(f"{name}_sum{suffix} {histogram.sum:.3f}")
+    return lines
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the run's logs
+
@@ -0,0 +1,131 @@
+"""
+Bounded-memory capture of command output.
+
+Agents can print a lot. Their output is streamed in chunks into an
+OutputBuffer, which keeps it in memory up to a cap and then spills it to a
+file, keeping only a tail in memory for the logs. Validators read the
+output from that file instead of a string holding all of it.
+"""
+
+MAX_MEMORY_BYTES = 1024 * 1024  # Spilled to disk past 1 MiB
+TAIL_BYTES = 64 * 1024
+SCAN_BLOCK_BYTES = 64 * 1024
+LOG_PREVIEW_BYTES = 8 * 1024
+
+WHITESPACE = b" \t\n\r\x0b\x0c"
+
+
+class OutputBuffer:
+    """
+    Output of a command, kept in memory until it reaches max_memory bytes,
+    in a file at spill_path after that.
+
+    Like the outputs of utils.command.run_command, the content is stripped:
+    leading whitespace is dropped as it arrives, trailing whitespace when the
+    buffer is closed.
+    """
+
+    def __init__(self, spill_path, max_memory=MAX_MEMORY_BYTES, tail_size=TAIL_BYTES):
+        self.spill_path = spill_path
+        self.max_memory = max_memory
+        self.tail_size = tail_size
+        self.memory = bytearray()
+        self.tail = bytearray()
+        self.file = None
+        self.size = 0
+
+    @property
+    def spilled(self):
+        return self.file is not None
+
+    def write(self, data):
+        """
+        Append a chunk of output.
+
+        Args:
+            data (bytes): The chunk.
+        """
+        if not self.size:
+            data = data.lstrip(WHITESPACE)
+            if not data:
+                return
+        self.size += len(data)
+        if not self.spilled and len(self.memory) + len(data) > self.max_memory:
+            self.file = open(self.spill_path, "wb")
+            self.file.write(self.memory)
+            self.tail = self.memory[-self.tail_size:]
+            self.memory = None
+        if not self.spilled:
+            self.memory += data
+            return
+        self.file.write(data)
+        # Ring buffer of the last tail_size bytes, trimmed in batches
+        self.tail += data
+        if len(self.tail) > 2 * self.tail_size:
+            del self.tail[: -self.tail_size]
+
+    def close(self):
+        """
+        Finish the capture once the command exited, stripping trailing whitespace.
+        """
+        if not self.spilled:
+            self.memory = bytearray(self.memory.rstrip(WHITESPACE))
+            self.size = len(self.memory)
+            return
+        if self.file.closed:
+            return
+        trailing = len(self.tail) - len(self.tail.rstrip(WHITESPACE))
+        if trailing == len(self.tail):
+            # Only whitespace in the tail, measure it in the file
+            trailing = self._trailing_whitespace_in_file()
+        self.size -= trailing
+        self.file.truncate(self.size)
+        self.file.close()
+        if trailing:
+            del self.tail[-trailing:]
+
+    def _trailing_whitespace_in_file(self):
+        """Count the whitespace bytes at the end of the spill file, one block at a time."""
+        self.file.flush()
+        trailing = 0
+        with open(self.spill_path, "rb") as file:
+            end = self.size
+            while end > 0:
+                start = max(0, end - SCAN_BLOCK_BYTES)
+                file.seek(start)
+                block = file.read(end - start)
+                stripped = len(block.rstrip(WHITESPACE))
+                trailing += len(block) - stripped
+                if stripped:
+                    break
+                end = start
+        return trailing
+
+    def preview(self, limit=LOG_PREVIEW_BYTES):
+        """
+        Get the end of the output, to log it.
+
+        Args:
+            limit (int): Maximum number of bytes shown.
+
+        Returns:
+            str: The output, or its last bytes with a note of how much was left out.
+        """
+        data = self.tail if self.spilled else self.memory
+        data = data[-limit:]
+        text = data.decode("utf-8", errors="replace")
+        if self.size > len(data):
+            return f"[... {self.size - len(data)} bytes omitted ...] {text}"
+        return text
+
+    def path(self):
+        """
+        Get a file holding the whole output, to pass it as stdin of a validator.
+
+        Returns:
+            str: Path of the file.
+        """
+        if not self.spilled:
+            with open(self.spill_path, "wb") as file:
+                file.write(self.memory)
+        return self.spill_path
@@ -0,0 +1,134 @@
+"""
+Preflight checks of the benchmark tasks.
+
+A broken task (an inline test_script that does not compile, a validator
+script or a dataset zip that is missing or unreadable) would only fail
+after the agent spent minutes and model tokens on it. The checks run once,
+right after the tasks are loaded, and broken tasks are rejected before any
+agent starts.
+"""
+
+import functools
+import logging
+import os
+import shlex
+import zipfile
+
+SCRIPTS_DIR = "scripts"
+
+
+@functools.lru_cache(maxsize=256)
+def compile_test_script(source):
+    """
+    Compile an inline test script. Code objects are cached by source, so a
+    script is compiled once however many attempts and runs use it.
+
+    Args:
+        source (str): Source of the inline test script.
+
+    Returns:
+        code: The compiled script.
+
+    Raises:
+        SyntaxError: If the script does not compile.
+    """
+    return compile(source, "<test_script>", "exec")
+
+
+def referenced_scripts(test_command):
+    """
+    Find the scripts of the scripts/ directory a test_command runs.
+
+    Args:
+        test_command (str): The task's test_command.
+
+    Returns:
+        list: Paths of the referenced scripts.
+    """
+    try:
+        words = shlex.split(test_command)
+    except ValueError:
+        words = test_command.split()
+    scripts = []
+    for word in words:
+        path = os.path.normpath(word)
+        if path.endswith(".py") and path.split(os.sep)[0] == SCRIPTS_DIR:
+            scripts.append(path)
+    return scripts
+
+
+def _check_script_file(path):
+    if not os.path.isfile(path):
+        return f"validator script {path} does not exist"
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            compile(file.read(), path, "exec")
+    except (OSError, UnicodeDecodeError, SyntaxError) as e:
+        return f"validator script {path} does not compile: {e}"
+    return None
+
+
+def _check_zip(zip_path):
+    if not os.path.exists(zip_path):
+        return None  # The task starts from an empty workspace
+    try:
+        # Reads the central directory only, not the whole archive
+        with zipfile.ZipFile(zip_path) as archive:
+            archive.namelist()
+    except (OSError, zipfile.BadZipFile) as e:
+        return f"dataset {zip_path} is not a readable zip file: {e}"
+    return None
+
+
+def check_task(task, files_dir, script_errors=None):
+    """
+    Check that a task can be run and validated.
+
+    Args:
+        task (dict): The task dictionary.
+        files_dir (str): The directory containing the dataset zips.
+        script_errors (dict, optional): Cache of the validator script checks,
+            shared between the tasks of a run.
+
+    Returns:
+        str: Why the task is broken, or None if it is fine.
+    """
+    if script_errors is None:
+        script_errors = {}
+    test_command = task.get("test_command")
+    test_script = task.get("test_script")
+    if test_command:
+        for path in referenced_scripts(test_command):
+            if path not in script_errors:
+                script_errors[path] = _check_script_file(path)
+            if script_errors[path]:
+                return script_errors[path]
+    elif test_script:
+        try:
+            compile_test_script(test_script)
+        except (SyntaxError, ValueError) as e:
+            return f"test_script does not compile: {e}"
+    else:
+        return "task has neither a test_command nor a test_script"
+    return _check_zip(os.path.join(files_dir, f"{task['id']}.zip"))
+
+
+def preflight_tasks(tasks, files_dir):
+    """
+    Check every task before any agent runs.
+
+    Args:
+        tasks (list): The tasks to run.
+        files_dir (str): The directory containing the dataset zips.
+
+    Returns:
+        dict: Task ID -> why the task is broken, for the broken tasks only.
+    """
+    script_errors = {}
+    rejected = {}
+    for task in tasks:
+        reason = check_task(task, files_dir, script_errors)
+        if reason:
+            logging.error(f"Rejecting task {task['id']}: {reason}")
+            rejected[task["id"]] = reason
+    return rejected
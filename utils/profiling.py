@@ -0,0 +1,151 @@
+"""
+CPU profile of the harness itself, across the parent and the pool workers.
+
+`evaluate.py --profile` runs cProfile in the parent's main thread for the
+whole run, and sets PROFILE_DIR_ENV before the workers are forked. The
+profiled sections of other threads and processes, like the tasks run by a
+pool worker or the batches of the database writer thread, then dump their
+stats to their own file of that directory after each section: pool workers
+are terminated at the end of the run, with no chance to save anything.
+At the end of the run, every file is merged into a single pstats file
+next to the benchmark report:
+
+    python -m pstats results/benchmark_report_<date>.prof
+
+Only one profiler can be active at a time: a forked worker first stops
+the profiler inherited from the parent (stop_inherited_profiler, from the
+Pool initializer), and a section is not profiled when another profiler
+already is. On Python 3.12 and later, cProfile covers every thread of the
+interpreter, so the parent's profile already includes its other threads.
+
+Nothing is profiled when the variable is not set.
+"""
+
+import cProfile
+import glob
+import io
+import logging
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+PROFILE_DIR_ENV = "BENCHMARK_PROFILE_DIR"
+
+# Functions listed at the end of the run
+TOP_FUNCTIONS = 20
+
+# (pid, thread) -> profiler accumulating the sections of that thread
+_profilers = {}
+
+# Profiler of the run and the pid of the process running it
+_run_profiler = None
+_run_profiler_pid = None
+
+
+class RunProfiler:
+    """
+    Profile of one run, started before the workers are forked.
+    """
+
+    def __init__(self):
+        self.profile_dir = tempfile.mkdtemp(prefix="benchmark-profile-")
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        """Profile the current thread, and let the processes started after this profile their sections."""
+        global _run_profiler, _run_profiler_pid
+        os.environ[PROFILE_DIR_ENV] = self.profile_dir
+        logging.info(f"Profiling the run, stats collected in {self.profile_dir}")
+        _run_profiler, _run_profiler_pid = self.profiler, os.getpid()
+        self.profiler.enable()
+
+    def export(self, output_path):
+        """
+        Stop profiling and merge the stats of every process into one pstats file.
+
+        Args:
+            output_path (str): Path of the merged stats.
+        """
+        global _run_profiler, _run_profiler_pid
+        self.profiler.disable()
+        _run_profiler = _run_profiler_pid = None
+        os.environ.pop(PROFILE_DIR_ENV, None)
+        stats = pstats.Stats(self.profiler)
+        for path in sorted(glob.glob(os.path.join(self.profile_dir, "*.prof"))):
+            try:
+                stats.add(path)
+            except (OSError, EOFError, ValueError, TypeError) as e:
+                # Dumped by a worker killed while writing it
+                logging.warning(f"Skipping profile {path}: {e}")
+
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        stats.dump_stats(output_path)
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        print(f"Profile saved to {output_path}, top functions by cumulative time:")
+        print(summary.getvalue())
+
+
+def stop_inherited_profiler():
+    """
+    Stop the run's profiler in a process forked while it was active, so the
+    process can profile its own sections. Does nothing in the parent.
+    """
+    global _run_profiler, _run_profiler_pid
+    if _run_profiler is not None and _run_profiler_pid != os.getpid():
+        _run_profiler.disable()
+        _run_profiler = _run_profiler_pid = None
+
+
+def _profiler_active():
+    """Whether a profiler already runs, which would make enabling another one fail or replace it."""
+    if sys.version_info >= (3, 12):
+        # Interpreter-wide since cProfile is built on sys.monitoring
+        return sys.monitoring.get_tool(sys.monitoring.PROFILER_ID) is not None
+    return sys.getprofile() is not None
+
+
+@contextmanager
+def profile_section(name):
+    """
+    Profile the body of the with statement, if the run is profiled.
+
+    The sections of a thread accumulate, and their stats are dumped after
+    each one, so whatever ends the process, the last dump is complete.
+    The section is not profiled when a profiler is already active, like
+    the run's profiler in the parent.
+
+    Args:
+        name (str): Name of the file of the thread's stats.
+    """
+    profile_dir = os.environ.get(PROFILE_DIR_ENV)
+    if not profile_dir or _profiler_active():
+        yield
+        return
+    key = (os.getpid(), threading.get_ident())
+    profiler = _profilers.get(key)
+    if profiler is None:
+        profiler = _profilers[key] = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Another profiling tool got there first
+        logging.debug(f"Section {name} not profiled: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = os.path.join(profile_dir, f"{os.getpid()}-{name}.prof")
+        profiler.dump_stats(path + ".tmp")
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,138 @@
+"""
+Rate limiter of the agent runs, shared by every process of the machine.
+
+With many workers, every @2501 agent would start at once and trip the
+providers' rate limits. The limiter caps the agent starts per second (a
+token bucket) and the agents in flight, per MAIN_ENGINE/SECONDARY_ENGINE
+model pair. Its state is a small JSON file locked with flock, so pool
+workers, asyncio tasks, the daemon and concurrent runs all share it.
+"""
+
+import asyncio
+import contextlib
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+
+LIMITER_DIR = os.path.join(".cache", "agent_limiter")
+
+# How often a start blocked by max_in_flight checks again
+IN_FLIGHT_POLL_SECONDS = 0.25
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class AgentRateLimiter:
+    """
+    Token bucket of agent starts plus a cap of agents in flight.
+
+    `config` is the "agent_rate_limit" section of the benchmark configuration,
+    e.g. {"starts_per_second": 1.0, "burst": 4, "max_in_flight": 8}. Missing
+    or zero values disable the corresponding limit.
+    """
+
+    def __init__(self, config=None, model_pair=None, state_dir=LIMITER_DIR):
+        config = config or {}
+        self.rate = float(config.get("starts_per_second") or 0)
+        self.burst = max(1, int(config.get("burst") or 1))
+        self.max_in_flight = int(config.get("max_in_flight") or 0)
+        if model_pair is None:
+            model_pair = [os.getenv("MAIN_ENGINE"), os.getenv("SECONDARY_ENGINE")]
+        key = re.sub(r"[^\w.-]+", "_", "__".join(str(model) for model in model_pair))
+        self.state_path = os.path.join(state_dir, f"{key}.json")
+
+    @property
+    def enabled(self):
+        return bool(self.rate or self.max_in_flight)
+
+    def _update(self, update):
+        """Run update(state) with the state file locked, and save the state it returns."""
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+        with open(fd, "r+", encoding="utf-8") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                state = json.loads(file.read() or "{}")
+            except ValueError:
+                state = {}  # Written by a process killed mid-write
+            state, result = update(state)
+            file.seek(0)
+            file.truncate()
+            json.dump(state, file)
+        return result
+
+    def try_acquire(self, slot_id):
+        """
+        Take a start token and an in-flight slot if both are available.
+
+        Args:
+            slot_id (str): Identifier of the slot, passed to release().
+
+        Returns:
+            float: 0 if acquired, otherwise the seconds to wait before trying again.
+        """
+
+        def update(state):
+            now = time.time()
+            tokens = state.get("tokens", self.burst)
+            if self.rate:
+                tokens = min(self.burst, tokens + (now - state.get("updated", now)) * self.rate)
+            # Slots of processes that died without releasing them are freed
+            in_flight = {
+                slot: pid for slot, pid in state.get("in_flight", {}).items() if _pid_alive(pid)
+            }
+            wait = 0.0
+            if self.max_in_flight and len(in_flight) >= self.max_in_flight:
+                wait = IN_FLIGHT_POLL_SECONDS
+            elif self.rate and tokens < 1:
+                wait = (1 - tokens) / self.rate
+            else:
+                if self.rate:
+                    tokens -= 1
+                in_flight[slot_id] = os.getpid()
+            return {"tokens": tokens, "updated": now, "in_flight": in_flight}, wait
+
+        return self._update(update)
+
+    def release(self, slot_id):
+        def update(state):
+            state.get("in_flight", {}).pop(slot_id, None)
+            return state, None
+
+        self._update(update)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """
+        Wait for the limiter and hold an in-flight slot while the agent runs.
+
+        Yields:
+            int: Milliseconds spent waiting on the limiter.
+        """
+        if not self.enabled:
+            yield 0
+            return
+        slot_id = uuid.uuid4().hex
+        start_time = time.monotonic()
+        # The state file is only locked for a read and a write, short enough
+        # to do on the event loop thread
+        while True:
+            wait = self.try_acquire(slot_id)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        try:
+            yield int((time.monotonic() - start_time) * 1000)
+        finally:
+            self.release(slot_id)
@@ -0,0 +1,141 @@
+"""
+Retry policy of the task attempts.
+
+Failures are classified from the agent's return code and stderr, or from
+the exception raised by the attempt. Each class is retried or not according
+to the policy, after an exponential backoff with jitter, so a rate limited
+model is not hammered and a transient failure does not end the task.
+
+A validator that raises gives a validation error, its verdict on the
+agent's work: the agent is never run again for it. When the policy lists
+validation errors, only the validator is run again, on the same output.
+"""
+
+import random
+import re
+
+SERVER_ERROR = "server_error"
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+VALIDATION_ERROR = "validation_error"
+AGENT_ERROR = "agent_error"
+ERROR = "error"
+
+# Checked in order, the first match gives the class
+FAILURE_PATTERNS = [
+    (
+        RATE_LIMIT,
+        re.compile(r"rate.?limit|too many requests|\b429\b|quota exceeded", re.IGNORECASE),
+    ),
+    (
+        TIMEOUT,
+        re.compile(r"timed? ?out|timeout|ETIMEDOUT|deadline exceeded", re.IGNORECASE),
+    ),
+    (
+        SERVER_ERROR,
+        re.compile(
+            r"The server has returned an error|internal server error|bad gateway|"
+            r"service unavailable|overloaded|\b50[0234]\b|ECONNRESET|ECONNREFUSED|"
+            r"socket hang up",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+DEFAULT_POLICY = {
+    "retry_on": [SERVER_ERROR, RATE_LIMIT, TIMEOUT, AGENT_ERROR],
+    "base_delay": 2.0,
+    "max_delay": 60.0,
+    "jitter": 0.5,
+    # Rate limits clear slowly, back off longer
+    "multipliers": {RATE_LIMIT: 4.0},
+}
+
+
+def classify_output(text):
+    """
+    Classify a failure from an error output.
+
+    Args:
+        text (str): stderr of the agent, or an error message.
+
+    Returns:
+        str: The failure class, or None if no pattern matches.
+    """
+    for failure_class, pattern in FAILURE_PATTERNS:
+        if pattern.search(text or ""):
+            return failure_class
+    return None
+
+
+class RetryPolicy:
+    """
+    Which failures to retry and how long to wait before the next attempt.
+
+    Configured by the "retry_policy" section of the benchmark configuration,
+    whose keys override DEFAULT_POLICY.
+    """
+
+    def __init__(self, config=None):
+        policy = dict(DEFAULT_POLICY, **(config or {}))
+        self.retry_on = set(policy["retry_on"])
+        self.base_delay = float(policy["base_delay"])
+        self.max_delay = float(policy["max_delay"])
+        self.jitter = float(policy["jitter"])
+        self.multipliers = policy["multipliers"]
+
+    def classify_agent_failure(self, returncode, stderr):
+        """
+        Classify a failed agent command.
+
+        Args:
+            returncode (int): Return code of the agent command.
+            stderr (str): stderr of the agent command.
+
+        Returns:
+            str: The failure class.
+        """
+        if returncode == 124:  # Exit code of timeout(1)
+            return TIMEOUT
+        return classify_output(stderr) or AGENT_ERROR
+
+    def classify_exception(self, error, validating=False):
+        """
+        Classify an exception raised by an attempt. Whatever its message,
+        an exception of the validator, like a script reading a file the
+        agent never created or timing out, is a validation error.
+
+        Args:
+            error (Exception): The exception.
+            validating (bool): Whether it was raised while validating the agent's work.
+
+        Returns:
+            str: The failure class.
+        """
+        if validating:
+            return VALIDATION_ERROR
+        if isinstance(error, TimeoutError):
+            return TIMEOUT
+        failure_class = classify_output(str(error))
+        if failure_class:
+            return failure_class
+        return ERROR
+
+    def should_retry(self, failure_class):
+        return failure_class in self.retry_on
+
+    def backoff(self, failure_class, retry):
+        """
+        Seconds to wait before a retry: exponential in the number of retries,
+        capped, with a random part so parallel tasks don't retry in lockstep.
+
+        Args:
+            failure_class (str): Class of the failure being retried.
+            retry (int): Number of the retry, starting at 1.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = self.base_delay * self.multipliers.get(failure_class, 1.0)
+        delay = min(self.max_delay, delay * 2 ** (retry - 1))
+        return delay * random.uniform(1.0 - self.jitter, 1.0)
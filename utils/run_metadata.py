@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from task_processor import get_cli_version
+from utils.git_utils import (
+    get_git_branch,
+    get_git_hash,
+    get_git_head_key,
+    get_local_changes,
+)
+
+RUN_METADATA_CACHE_PATH = os.path.join(".cache", "run_metadata.json")
+
+
+def _get_cli_key():
+    """Identify the installed CLI by the path and modification time of its binary."""
+    cli_path = shutil.which("@2501")
+    if not cli_path:
+        return None
+    cli_path = os.path.realpath(cli_path)
+    return f"{cli_path}@{os.stat(cli_path).st_mtime_ns}"
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path, "r") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_cache(cache_path, cache):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(cache, file)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # The cache is only an optimization
+
+
+def get_run_metadata(cache_path=RUN_METADATA_CACHE_PATH):
+    """
+    Get the git and CLI information describing the benchmark run.
+
+    The git branch and hash are cached per git HEAD and the CLI version per
+    CLI binary, the remaining probes run concurrently.
+
+    Args:
+        cache_path (str): Path to the cache file.
+
+    Returns:
+        dict: benchmark_branch, benchmark_hash, benchmark_local_changes and cli_version.
+    """
+    cache = _load_cache(cache_path)
+    head_key = get_git_head_key()
+    cli_key = _get_cli_key()
+    git_cache = cache.get("git", {})
+    cli_cache = cache.get("cli", {})
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # Local changes depend on the working tree, they are never cached
+        local_changes = executor.submit(get_local_changes)
+        if head_key is None or git_cache.get("key") != head_key:
+            branch = executor.submit(get_git_branch)
+            commit_hash = executor.submit(get_git_hash)
+            git_cache = {
+                "key": head_key,
+                "benchmark_branch": branch.result(),
+                "benchmark_hash": commit_hash.result(),
+            }
+        if cli_key is None or cli_cache.get("key") != cli_key:
+            cli_cache = {"key": cli_key, "cli_version": get_cli_version()}
+
+        metadata = {
+            "benchmark_branch": git_cache["benchmark_branch"],
+            "benchmark_hash": git_cache["benchmark_hash"],
+            "benchmark_local_changes": local_changes.result(),
+            "cli_version": cli_cache["cli_version"],
+        }
+
+    if cache.get("git") != git_cache or cache.get("cli") != cli_cache:
+        _save_cache(cache_path, {"git": git_cache, "cli": cli_cache})
+    return metadata
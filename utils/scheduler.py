@@ -0,0 +1,218 @@
+import asyncio
+import contextlib
+import glob
+import heapq
+import json
+import logging
+import os
+import queue
+
+# Expected duration of a task when neither it nor its tags were ever run
+DEFAULT_TASK_DURATION_MS = 60000
+# Only the most recent reports are read, older runs say little about today's engine
+HISTORY_MAX_REPORTS = 50
+
+
+def load_duration_history(results_dir="./results", max_reports=HISTORY_MAX_REPORTS):
+    """
+    Average the task durations recorded in previous benchmark reports.
+
+    Args:
+        results_dir (str): Directory containing the benchmark_report_*.json files.
+        max_reports (int): Number of most recent reports to read.
+
+    Returns:
+        dict: "tasks" and "tags", each mapping a name to an average duration_ms.
+    """
+    report_paths = sorted(
+        glob.glob(os.path.join(results_dir, "benchmark_report_*.json")),
+        key=os.path.getmtime,
+        reverse=True,
+    )[:max_reports]
+
+    task_totals = {}
+    tag_totals = {}
+    for report_path in report_paths:
+        try:
+            with open(report_path, "r") as file:
+                report = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            continue
+        for test in report.get("tests", []):
+            for result in test.get("results", []):
+                duration = result.get("metrics", {}).get("duration_ms")
+                if not duration:
+                    continue
+                for totals, key in [(task_totals, test["name"])] + [
+                    (tag_totals, tag) for tag in test.get("tags", [])
+                ]:
+                    total = totals.setdefault(key, [0, 0])
+                    total[0] += duration
+                    total[1] += 1
+
+    return {
+        "tasks": {name: total / count for name, (total, count) in task_totals.items()},
+        "tags": {tag: total / count for tag, (total, count) in tag_totals.items()},
+    }
+
+
+def estimate_duration(task, history):
+    """
+    Estimate the duration of a task from its own history, else from the history of its tags.
+
+    Args:
+        task (dict): The task dictionary.
+        history (dict): Durations returned by load_duration_history.
+
+    Returns:
+        float: Expected duration in milliseconds.
+    """
+    if task["id"] in history["tasks"]:
+        return history["tasks"][task["id"]]
+    tag_durations = [
+        history["tags"][tag] for tag in task.get("tags", []) if tag in history["tags"]
+    ]
+    if tag_durations:
+        return sum(tag_durations) / len(tag_durations)
+    if history["tasks"]:
+        return sum(history["tasks"].values()) / len(history["tasks"])
+    return DEFAULT_TASK_DURATION_MS
+
+
+def predict_makespan(durations, workers):
+    """
+    Simulate dispatching durations, in order, to the first free worker.
+
+    Args:
+        durations (list): Expected durations in milliseconds, in dispatch order.
+        workers (int): Number of tasks running at once.
+
+    Returns:
+        float: Expected wall time of the whole run in milliseconds.
+    """
+    loads = [0.0] * max(1, min(workers, len(durations)))
+    for duration in durations:
+        heapq.heappush(loads, heapq.heappop(loads) + duration)
+    return max(loads)
+
+
+def schedule_longest_first(tasks, workers, results_dir="./results"):
+    """
+    Order tasks longest-expected-first so slow tasks don't end up running
+    alone at the end of the run, and log the predicted makespan.
+
+    Args:
+        tasks (list): Tasks to run.
+        workers (int): Number of tasks running at once.
+        results_dir (str): Directory containing previous benchmark reports.
+
+    Returns:
+        list: The tasks in dispatch order.
+    """
+    history = load_duration_history(results_dir)
+    estimates = {task["id"]: estimate_duration(task, history) for task in tasks}
+    # Stable sort: without any history the file order is kept
+    ordered = sorted(tasks, key=lambda task: estimates[task["id"]], reverse=True)
+
+    durations = [estimates[task["id"]] for task in ordered]
+    makespan_ms = predict_makespan(durations, workers)
+    in_file_order_ms = predict_makespan([estimates[task["id"]] for task in tasks], workers)
+    logging.info(
+        f"Predicted makespan: {makespan_ms / 1000:.0f}s on {workers} workers "
+        f"({in_file_order_ms / 1000:.0f}s in file order, "
+        f"{len(history['tasks'])} tasks with history)"
+    )
+    return ordered
+
+
+class ResourceLimits:
+    """
+    Concurrency limits per resource class, derived from the task tags.
+
+    `limits` maps a tag to the maximum number of tasks with that tag running
+    at once, e.g. {"docker": 2, "terraform": 2, "default": 16}. Tasks without
+    any limited tag fall in the "default" class, unlimited if not configured.
+    A task counts against every limited class it is tagged with.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = {name: max(1, int(limit)) for name, limit in (limits or {}).items()}
+        self.running = {name: 0 for name in self.limits}
+        self.semaphores = {}
+
+    def classes(self, task):
+        """Get the limited resource classes of a task."""
+        classes = sorted(
+            tag for tag in set(task.get("tags", [])) if tag in self.limits and tag != "default"
+        )
+        if not classes and "default" in self.limits:
+            classes = ["default"]
+        return classes
+
+    def can_start(self, task):
+        return all(self.running[name] < self.limits[name] for name in self.classes(task))
+
+    def acquire(self, task):
+        for name in self.classes(task):
+            self.running[name] += 1
+
+    def release(self, task):
+        for name in self.classes(task):
+            self.running[name] -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, task):
+        """
+        Hold a slot in every resource class of the task, for the asyncio engine.
+        """
+        async with contextlib.AsyncExitStack() as stack:
+            # Always acquired in sorted order, so two tasks can't deadlock
+            for name in self.classes(task):
+                if name not in self.semaphores:
+                    self.semaphores[name] = asyncio.Semaphore(self.limits[name])
+                await stack.enter_async_context(self.semaphores[name])
+            yield
+
+
+def dispatch_with_limits(pool, worker, process_args, num_workers, limits):
+    """
+    Run tasks on a pool, never exceeding the resource class limits, and yield
+    the results as they complete.
+
+    Tasks are started in order, but a task whose class is full is skipped in
+    favor of the next one that fits, so light tasks keep the free workers busy
+    while heavy ones wait.
+
+    Args:
+        pool (multiprocessing.Pool): The worker pool.
+        worker (callable): Function run on the pool, taking one item of process_args.
+        process_args (list): Worker arguments, tuples whose first item is the task.
+        num_workers (int): Number of tasks running at once.
+        limits (ResourceLimits): The resource class limits.
+    """
+    completed = queue.Queue()
+    pending = list(process_args)
+    running = 0
+    while pending or running:
+        index = 0
+        while running < num_workers and index < len(pending):
+            task = pending[index][0]
+            if not limits.can_start(task):
+                index += 1
+                continue
+            args = pending.pop(index)
+            limits.acquire(task)
+            running += 1
+            pool.apply_async(
+                worker,
+                (args,),
+                callback=lambda result, task=task: completed.put((task, result, None)),
+                error_callback=lambda error, task=task: completed.put((task, None, error)),
+            )
+
+        task, result, error = completed.get()
+        running -= 1
+        limits.release(task)
+        if error is not None:
+            raise error
+        yield result
@@ -0,0 +1,91 @@
+"""
+Per-phase timing of the task attempts.
+
+A task's duration_ms lumps the workspace extraction, the agent init, the
+agent run, the validator and the waits between retries together. Each
+attempt times its phases with a monotonic clock instead, so a slow run can
+be attributed to the engine or to the harness.
+"""
+
+import time
+from contextlib import contextmanager
+
+from utils.tracing import record_span
+
+# Phases of an attempt, in the order they run
+WORKSPACE = "workspace"
+RATE_LIMIT = "rate_limit"
+AGENT_INIT = "agent_init"
+AGENT = "agent"
+VALIDATOR = "validator"
+RETRY_WAIT = "retry_wait"
+
+PERCENTILES = (50, 90, 99)
+
+
+class PhaseTimer:
+    """
+    Durations in milliseconds of the phases of one attempt, by phase name.
+    A phase run several times accumulates.
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, name, duration_ms):
+        """
+        Record a duration measured elsewhere, like a rate limiter wait.
+
+        Args:
+            name (str): The phase.
+            duration_ms (int): Its duration in milliseconds.
+        """
+        self.phases[name] = self.phases.get(name, 0) + int(duration_ms)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the body of the with statement as the given phase, even if it
+        raises. The phase is also a span of the run's trace, if recorded.
+
+        Args:
+            name (str): The phase.
+        """
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, (time.monotonic() - start_time) * 1000)
+            record_span(name, start_time)
+
+
+def merge_phases(timings):
+    """
+    Sum the phases of several attempts.
+
+    Args:
+        timings (list): Phase durations of each attempt, as in PhaseTimer.phases.
+
+    Returns:
+        dict: Total duration in milliseconds of each phase.
+    """
+    totals = {}
+    for phases in timings:
+        for name, duration_ms in phases.items():
+            totals[name] = totals.get(name, 0) + duration_ms
+    return totals
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile.
+
+    Args:
+        sorted_values (list): The values, sorted, not empty.
+        percent (int): The percentile, between 0 and 100.
+
+    Returns:
+        The value below which percent of the values fall.
+    """
+    rank = -(-percent * len(sorted_values) // 100)  # Ceiling
+    return sorted_values[max(rank, 1) - 1]
@@ -0,0 +1,191 @@
+"""
+Timeline of a run in the Trace Event Format, to open in Perfetto or chrome://tracing.
+
+`evaluate.py --trace out.json` sets TRACE_DIR_ENV before the workers are
+forked. Every process then appends its spans, as JSON lines, to its own
+file of that directory, so no process waits on another to record a span.
+At the end of the run, the files are merged into a single trace with a
+lane per process and thread. Coroutines of the asyncio engine get a lane
+per concurrency slot instead, as they share one thread.
+
+Nothing is recorded when the variable is not set.
+"""
+
+import contextvars
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_DIR_ENV = "BENCHMARK_TRACE_DIR"
+
+# Longer arguments, like agent prompts, are cut in the trace
+MAX_ARG_CHARS = 200
+
+# (lane id, lane name) of the current coroutine, set by the asyncio engine
+_lane = contextvars.ContextVar("trace_lane", default=None)
+
+# Span file of the current process, reopened after a fork
+_span_file = None
+_span_file_pid = None
+_span_file_lock = threading.Lock()
+
+
+def start_trace():
+    """
+    Start recording spans in this process and in the processes it starts.
+
+    Returns:
+        str: Directory receiving the span files, to pass to export_trace.
+    """
+    trace_dir = tempfile.mkdtemp(prefix="benchmark-trace-")
+    os.environ[TRACE_DIR_ENV] = trace_dir
+    logging.info(f"Recording trace spans in {trace_dir}")
+    return trace_dir
+
+
+def set_lane(lane_id, name):
+    """
+    Record the spans of the current coroutine, and of the tasks it starts,
+    in their own lane.
+
+    Args:
+        lane_id (int): Lane number, unique within the process.
+        name (str): Name shown for the lane.
+    """
+    _lane.set((lane_id, name))
+
+
+def record_span(name, start_time, **args):
+    """
+    Record a span that started at start_time and ends now.
+
+    Args:
+        name (str): Span name, e.g. "task" or "agent".
+        start_time (float): Start of the span, from time.monotonic().
+        **args: Details shown with the span.
+    """
+    trace_dir = os.environ.get(TRACE_DIR_ENV)
+    if not trace_dir:
+        return
+    end_time = time.monotonic()
+    lane = _lane.get()
+    if lane is None:
+        thread = threading.current_thread()
+        lane = (threading.get_native_id(), thread.name)
+    event = {
+        "name": name,
+        "ph": "X",
+        # CLOCK_MONOTONIC is shared by the processes of the machine
+        "ts": int(start_time * 1_000_000),
+        "dur": int((end_time - start_time) * 1_000_000),
+        "pid": os.getpid(),
+        "tid": lane[0],
+        "thread_name": lane[1],
+        "args": {key: _trace_arg(value) for key, value in args.items()},
+    }
+    _write_span(trace_dir, json.dumps(event))
+
+
+@contextmanager
+def span(name, **args):
+    """
+    Record the body of the with statement as a span, even if it raises.
+
+    Args:
+        name (str): Span name.
+        **args: Details shown with the span.
+    """
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        record_span(name, start_time, **args)
+
+
+def _trace_arg(value):
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+    value = str(value)
+    return value if len(value) <= MAX_ARG_CHARS else value[:MAX_ARG_CHARS] + "..."
+
+
+def _write_span(trace_dir, line):
+    global _span_file, _span_file_pid
+    with _span_file_lock:
+        if _span_file_pid != os.getpid():
+            # Forked workers inherit the parent's file object, not its ownership
+            _span_file = open(
+                os.path.join(trace_dir, f"{os.getpid()}.jsonl"), "a", buffering=1
+            )
+            _span_file_pid = os.getpid()
+        _span_file.write(line + "\n")
+
+
+def export_trace(trace_dir, output_path):
+    """
+    Merge the span files of every process into one Trace Event Format file,
+    and stop recording.
+
+    Args:
+        trace_dir (str): Directory returned by start_trace.
+        output_path (str): Path of the JSON trace.
+    """
+    global _span_file, _span_file_pid
+    os.environ.pop(TRACE_DIR_ENV, None)
+    with _span_file_lock:
+        if _span_file_pid == os.getpid():
+            _span_file.close()
+        _span_file = _span_file_pid = None
+    main_pid = os.getpid()
+    events = []
+    lanes = {}
+    for path in glob.glob(os.path.join(trace_dir, "*.jsonl")):
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Last line of a worker killed while writing it
+                lanes[(event["pid"], event["tid"])] = event.pop("thread_name")
+                events.append(event)
+    events.sort(key=lambda event: event["ts"])
+
+    metadata = []
+    for pid in sorted({pid for pid, _ in lanes}):
+        process_name = "evaluate" if pid == main_pid else f"worker {pid}"
+        metadata.append(
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process_name}}
+        )
+        # Workers are listed after the parent
+        metadata.append(
+            {
+                "name": "process_sort_index",
+                "ph": "M",
+                "pid": pid,
+                "args": {"sort_index": 0 if pid == main_pid else pid},
+            }
+        )
+    for (pid, tid), thread_name in sorted(lanes.items()):
+        metadata.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": thread_name},
+            }
+        )
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output_path, "w") as file:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, file)
+    shutil.rmtree(trace_dir, ignore_errors=True)
+    print(f"Trace of {len(events)} spans saved to {output_path}")
@@ -0,0 +1,444 @@
+"""
+Warm worker running the registered validators of scripts/ and the inline
+test_script of the tasks.
+
+The worker is a long-lived Python process with the validators' dependencies
+already imported and their code already compiled. It forks a child for
+every validation, so each one still gets a fresh module namespace, its own
+stdin/stdout/stderr and exit code, exactly like `python scripts/<name>.py`,
+for roughly the cost of a fork instead of an interpreter start. Inline test
+scripts run the same way, in a clean namespace, and report their `output`
+verdict; a hard timeout kills the child whatever the script is doing.
+
+Requests and responses are JSON lines over the worker's stdin/stdout, the
+validator input and outputs go through files in a private directory.
+"""
+
+import asyncio
+import builtins
+import itertools
+import json
+import logging
+import os
+import select
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from scripts import VALIDATORS
+from utils.command import COMMAND_TIMEOUT, run_command_async
+from utils.preflight import compile_test_script
+
+# Heavy third party modules the validators import
+PRELOAD_MODULES = ("yaml", "hcl2", "pymongo")
+
+# Modules available to inline test scripts without importing them
+SCRIPT_MODULES = (
+    "os",
+    "sys",
+    "time",
+    "zipfile",
+    "struct",
+    "subprocess",
+    "logging",
+    "signal",
+    "json",
+)
+
+TEST_SCRIPT_TIMEOUT = 120  # 2 minutes
+
+PYTHON_COMMANDS = {"python", "python3", sys.executable}
+
+# Shell syntax that needs a real shell to run the test_command
+SHELL_OPERATORS = set("|&;<>()$`")
+
+
+def parse_validator_command(test_command):
+    """
+    Recognize a test_command running a registered validator, like
+    `python ./scripts/test_unique_keys.py ./datasets/honest_21/unique_keys.json`.
+
+    Args:
+        test_command (str): The task's test_command.
+
+    Returns:
+        tuple: (script path, arguments), or None if it must run through the shell.
+    """
+    if any(char in SHELL_OPERATORS for char in test_command):
+        return None
+    try:
+        argv = shlex.split(test_command)
+    except ValueError:
+        return None
+    if len(argv) < 2 or argv[0] not in PYTHON_COMMANDS:
+        return None
+    script_path = os.path.normpath(argv[1])
+    name = os.path.splitext(os.path.basename(script_path))[0]
+    if VALIDATORS.get(name) != script_path.replace(os.sep, "/"):
+        return None
+    return script_path, argv[2:]
+
+
+class ValidatorClient:
+    """
+    Handle to the validator worker of the current process, safe to use from
+    any thread. The worker is started on first use, and again if it died or
+    the process was forked.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.pid = None
+        self.work_dir = None
+        self.pending = {}
+        self.ids = itertools.count()
+
+    def _ensure_started(self):
+        if self.pid == os.getpid() and self.process.poll() is None:
+            return
+        self.work_dir = tempfile.mkdtemp(prefix="validators-")
+        env = os.environ.copy()
+        env["TERM"] = "xterm"  # Same environment as utils.command.run_command
+        env["PYTHONIOENCODING"] = "utf-8"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "utils.validator_service", self.work_dir],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        self.pid = os.getpid()
+        self.pending = {}
+        threading.Thread(
+            target=self._read_responses,
+            args=(self.process, self.pending),
+            name="validator-responses",
+            daemon=True,
+        ).start()
+
+    def _read_responses(self, process, pending):
+        for line in process.stdout:
+            response = json.loads(line)
+            with self.lock:
+                future = pending.pop(response["id"], None)
+            if future is not None:
+                future.set_result(response)
+        # The worker exited, fail whatever it was still running
+        with self.lock:
+            futures = list(pending.values())
+            pending.clear()
+        for future in futures:
+            future.set_exception(RuntimeError("Validator worker exited"))
+
+    def submit(self, request, input_data, timeout, input_path=None):
+        """
+        Run a request in a forked child of the worker.
+
+        Args:
+            request (dict): What to run, see serve().
+            input_data (str, optional): Data passed to the child as stdin.
+            timeout (float): Seconds before the child is killed.
+            input_path (str, optional): File passed to the child as stdin, instead of input_data.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a dict with the child's
+            "stdout", "stderr", "returncode" and "result", the verdict of an
+            inline script (None if it did not report one).
+        """
+        with self.lock:
+            self._ensure_started()
+            request_id = next(self.ids)
+            stdin_path = input_path and os.path.abspath(input_path)
+            if stdin_path is None:
+                stdin_path = os.path.join(self.work_dir, f"{request_id}.in")
+                with open(stdin_path, "w", encoding="utf-8") as file:
+                    file.write(input_data or "")
+            response_future = Future()
+            self.pending[request_id] = response_future
+            request = dict(request, id=request_id, stdin=stdin_path, timeout=timeout)
+            self.process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+            self.process.stdin.flush()
+
+        result_future = Future()
+
+        def collect(done):
+            try:
+                response = done.result()
+                for key in ("stdout", "stderr"):
+                    with open(response[key], "r", encoding="utf-8", errors="replace") as file:
+                        output = file.read().strip()
+                    os.unlink(response[key])
+                    response[key] = output
+                result = None
+                if os.path.exists(response["result"]):
+                    with open(response["result"], "r", encoding="utf-8") as file:
+                        result = json.load(file)
+                    os.unlink(response["result"])
+                response["result"] = result
+                result_future.set_result(response)
+            except Exception as e:
+                result_future.set_exception(e)
+            finally:
+                if input_path is None:
+                    os.unlink(stdin_path)
+
+        response_future.add_done_callback(collect)
+        return result_future
+
+
+_client = ValidatorClient()
+
+
+async def run_test_command_async(test_command, input_data=None, input_path=None):
+    """
+    Run a task's test_command, in the warm validator worker when it runs a
+    registered validator, through the shell otherwise.
+
+    Args:
+        test_command (str): The test command.
+        input_data (str, optional): Input data to pass to the command as stdin.
+        input_path (str, optional): File passed to the command as stdin, instead of input_data.
+
+    Returns:
+        tuple: stdout, stderr, and return code of the command.
+    """
+    parsed = parse_validator_command(test_command)
+    if parsed is None:
+        return await run_command_async(
+            test_command, input_data=input_data, input_path=input_path
+        )
+    script_path, args = parsed
+    request = {"kind": "validator", "script": script_path, "args": args}
+    response = await asyncio.wrap_future(
+        _client.submit(request, input_data, COMMAND_TIMEOUT, input_path)
+    )
+    return response["stdout"], response["stderr"], response["returncode"]
+
+
+async def run_test_script_async(
+    test_script, agent_stdout=None, timeout=TEST_SCRIPT_TIMEOUT, input_path=None
+):
+    """
+    Run a task's inline test_script in the validator worker. The script sees
+    the SCRIPT_MODULES and `agent_stdout`, and sets `output` to its verdict.
+    Safe to call from any thread or event loop, concurrently.
+
+    Args:
+        test_script (str): Source of the inline test script.
+        agent_stdout (str, optional): Output of the agent, available to the script.
+        timeout (float): Seconds before the script is killed.
+        input_path (str, optional): File holding the output of the agent, instead of agent_stdout.
+
+    Returns:
+        str: The verdict, "PASS" or "FAIL" for well behaved scripts.
+
+    Raises:
+        TimeoutError: If the script ran for longer than timeout.
+        RuntimeError: If the script raised, with the script's error message.
+    """
+    request = {"kind": "script", "source": test_script}
+    response = await asyncio.wrap_future(
+        _client.submit(request, agent_stdout, timeout, input_path)
+    )
+    if response["stderr"]:
+        logging.error(f"Test script stderr: {response['stderr']}")
+    result = response["result"]
+    if result is None:
+        if response["returncode"] == -signal.SIGKILL:
+            raise TimeoutError(f"Test script timed out after {timeout}s")
+        raise RuntimeError(f"Test script exited with code {response['returncode']}")
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result["output"].strip().upper()
+
+
+def _compile_validators():
+    code_objects = {}
+    for script_path in VALIDATORS.values():
+        try:
+            with open(script_path, "r", encoding="utf-8") as file:
+                code_objects[script_path] = compile(file.read(), script_path, "exec")
+        except (OSError, SyntaxError):
+            pass  # Reported when the validator is actually run
+    return code_objects
+
+
+def _redirect_stdio(request, stdout_path, stderr_path):
+    os.setpgid(0, 0)
+    stdin_fd = os.open(request["stdin"], os.O_RDONLY)
+    stdout_fd = os.open(stdout_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    stderr_fd = os.open(stderr_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    for fd, target in ((stdin_fd, 0), (stdout_fd, 1), (stderr_fd, 2)):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+    sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", closefd=False)
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+
+def _run_validator(code_objects, request, stdout_path, stderr_path):
+    """Body of the forked child: run one validator like `python script args`."""
+    _redirect_stdio(request, stdout_path, stderr_path)
+    script_path = request["script"]
+    sys.argv = [script_path] + request["args"]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
+    returncode = 0
+    try:
+        code = code_objects.get(script_path)
+        if code is None:
+            with open(script_path, "r", encoding="utf-8") as file:
+                code = compile(file.read(), script_path, "exec")
+        exec(
+            code,
+            {"__name__": "__main__", "__file__": script_path, "__builtins__": builtins},
+        )
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException as e:
+        # Like the interpreter, show the traceback from the script's frame
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        returncode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(returncode & 0xFF)
+
+
+def _run_test_script(request, stdout_path, stderr_path, result_path):
+    """Body of the forked child: run an inline test script and report its verdict."""
+    _redirect_stdio(request, stdout_path, stderr_path)
+    namespace = {name: sys.modules[name] for name in SCRIPT_MODULES}
+    namespace["__name__"] = "__test_script__"
+    namespace["__builtins__"] = builtins
+    namespace["agent_stdout"] = sys.stdin.read()
+    try:
+        exec(compile_test_script(request["source"]), namespace)
+        output = namespace.get("output", "FAIL")
+        if not isinstance(output, str):
+            raise TypeError(f"output must be a string, not {type(output).__name__}")
+        result = {"output": output}
+    except SystemExit as e:
+        result = {"error": f"Test script exited with {e.code}"}
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        result = {"error": str(e)}
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    with open(result_path, "w", encoding="utf-8") as file:
+        json.dump(result, file)
+    os._exit(0)
+
+
+def serve(work_dir):
+    """
+    Main loop of the validator worker: fork a child per request and answer
+    once it exits or is killed for running past its timeout.
+
+    Requests are {"id", "kind", "stdin", "timeout"} plus "script" and "args"
+    for a "validator", "source" for an inline "script".
+    """
+    for module in PRELOAD_MODULES + SCRIPT_MODULES:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    code_objects = _compile_validators()
+
+    # Wake up select() as soon as a child exits
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The harness handles CTRL+C
+
+    children = {}  # pid -> (request, deadline, stdout, stderr and result paths)
+    buffer = b""
+    stdin_open = True
+    while stdin_open or children:
+        now = time.monotonic()
+        timeout = None
+        if children:
+            timeout = max(0.0, min(child[1] for child in children.values()) - now)
+        readable, _, _ = select.select(
+            [wakeup_read] + ([0] if stdin_open else []), [], [], timeout
+        )
+
+        if 0 in readable:
+            data = os.read(0, 65536)
+            if not data:
+                stdin_open = False  # The harness is gone, finish and exit
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                request = json.loads(line)
+                stdout_path = os.path.join(work_dir, f"{request['id']}.out")
+                stderr_path = os.path.join(work_dir, f"{request['id']}.err")
+                result_path = os.path.join(work_dir, f"{request['id']}.json")
+                if request["kind"] == "script":
+                    try:
+                        # Compiled in the worker, the children inherit the cache
+                        compile_test_script(request["source"])
+                    except (SyntaxError, ValueError):
+                        pass  # Reported by the child
+                pid = os.fork()
+                if pid == 0:
+                    if request["kind"] == "script":
+                        _run_test_script(request, stdout_path, stderr_path, result_path)
+                    _run_validator(code_objects, request, stdout_path, stderr_path)
+                deadline = time.monotonic() + request["timeout"]
+                children[pid] = (
+                    request,
+                    deadline,
+                    stdout_path,
+                    stderr_path,
+                    result_path,
+                )
+        if wakeup_read in readable:
+            os.read(wakeup_read, 4096)
+
+        now = time.monotonic()
+        for pid, (request, deadline, *_) in children.items():
+            if deadline <= now:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            if pid not in children:
+                continue
+            request, _, stdout_path, stderr_path, result_path = children.pop(pid)
+            response = {
+                "id": request["id"],
+                "returncode": os.waitstatus_to_exitcode(status),
+                "stdout": stdout_path,
+                "stderr": stderr_path,
+                "result": result_path,
+            }
+            os.write(1, (json.dumps(response) + "\n").encode("utf-8"))
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])